@@ -0,0 +1,24 @@
+"""Add composite index for the room bets listing
+
+Revision ID: 2c8e5f3a9d17
+Revises: 7b2d4e9f1a63
+Create Date: 2026-10-18 17:05:52.640128
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '2c8e5f3a9d17'
+down_revision = '7b2d4e9f1a63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE bets SET created_at = NOW() WHERE created_at IS NULL")
+    op.create_index('ix_bets_room_id_created_at_id', 'bets', ['room_id', 'created_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_bets_room_id_created_at_id', table_name='bets')
@@ -0,0 +1,23 @@
+"""Add room_members (room_id, user_id) index
+
+Revision ID: 3b9e7c2d4f81
+Revises: 8f1b4d7e2a35
+Create Date: 2026-10-18 22:15:49.203116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3b9e7c2d4f81'
+down_revision = '8f1b4d7e2a35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_room_members_room_id_user_id', 'room_members', ['room_id', 'user_id'])
+
+
+def downgrade():
+    op.drop_index('ix_room_members_room_id_user_id', table_name='room_members')
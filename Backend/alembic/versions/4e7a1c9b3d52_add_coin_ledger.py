@@ -0,0 +1,61 @@
+"""Add append-only coin ledger
+
+Revision ID: 4e7a1c9b3d52
+Revises: 9d41b6c8e2f5
+Create Date: 2026-10-18 19:05:41.318224
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '4e7a1c9b3d52'
+down_revision = '9d41b6c8e2f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'coin_ledger',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.Column('reason', sa.Enum('OPENING_BALANCE', 'BET_ESCROW', 'BET_PAYOUT', 'BET_REFUND', name='ledger_reason'), nullable=False),
+        sa.Column('bet_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('snapshotted', sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['bet_id'], ['bets.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_coin_ledger_user_id_id', 'coin_ledger', ['user_id', 'id'])
+    op.create_index(
+        'ix_coin_ledger_unsnapshotted',
+        'coin_ledger',
+        ['user_id'],
+        postgresql_where=sa.text('NOT snapshotted')
+    )
+
+    # Current balances become the opening snapshot, recorded so that
+    # users.coins always equals the sum of a user's snapshotted entries
+    op.execute("""
+        INSERT INTO coin_ledger (user_id, amount, reason, created_at, snapshotted)
+        SELECT id, coins, 'OPENING_BALANCE', NOW(), true FROM users
+    """)
+
+
+def downgrade():
+    # Fold any unsnapshotted tail back into users.coins before dropping it
+    op.execute("""
+        UPDATE users SET coins = users.coins + tail.amount
+        FROM (
+            SELECT user_id, SUM(amount) AS amount FROM coin_ledger
+            WHERE NOT snapshotted GROUP BY user_id
+        ) AS tail
+        WHERE users.id = tail.user_id
+    """)
+    op.drop_index('ix_coin_ledger_unsnapshotted', table_name='coin_ledger')
+    op.drop_index('ix_coin_ledger_user_id_id', table_name='coin_ledger')
+    op.drop_table('coin_ledger')
+    sa.Enum(name='ledger_reason').drop(op.get_bind(), checkfirst=True)
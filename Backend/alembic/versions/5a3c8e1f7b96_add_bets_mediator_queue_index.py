@@ -0,0 +1,28 @@
+"""Add mediator work queue index to bets
+
+Revision ID: 5a3c8e1f7b96
+Revises: b81f6d3a0c74
+Create Date: 2026-10-18 20:21:37.140558
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5a3c8e1f7b96'
+down_revision = 'b81f6d3a0c74'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_bets_mediator_queue',
+        'bets',
+        ['mediator_id', 'status', 'end_time'],
+        postgresql_where=sa.text("result = 'UNKNOWN'")
+    )
+
+
+def downgrade():
+    op.drop_index('ix_bets_mediator_queue', table_name='bets')
@@ -0,0 +1,35 @@
+"""Add per-user unread notification counters
+
+Revision ID: 6c2d9a4e8b13
+Revises: 3b9e7c2d4f81
+Create Date: 2026-10-18 22:47:30.861574
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '6c2d9a4e8b13'
+down_revision = '3b9e7c2d4f81'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'notification_counters',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('unread', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    op.execute("""
+        INSERT INTO notification_counters (user_id, unread)
+        SELECT user_id, COUNT(*) FROM notifications
+        WHERE resolved IS NOT TRUE
+        GROUP BY user_id
+    """)
+
+
+def downgrade():
+    op.drop_table('notification_counters')
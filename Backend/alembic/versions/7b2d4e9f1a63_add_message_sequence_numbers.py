@@ -0,0 +1,60 @@
+"""Add per-room message sequence numbers
+
+Revision ID: 7b2d4e9f1a63
+Revises: e5a92c4b71d0
+Create Date: 2026-10-18 15:21:36.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7b2d4e9f1a63'
+down_revision = 'e5a92c4b71d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('rooms', sa.Column('last_message_seq', sa.BigInteger(), nullable=False, server_default='0'))
+    op.add_column('messages', sa.Column('seq', sa.BigInteger(), nullable=True))
+
+    # Number existing history in chronological order
+    op.execute("""
+        UPDATE messages m
+        SET seq = numbered.seq
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY room_id ORDER BY created_at, id) AS seq
+            FROM messages
+        ) AS numbered
+        WHERE m.id = numbered.id
+    """)
+    op.execute("""
+        UPDATE rooms r
+        SET last_message_seq = COALESCE((SELECT MAX(seq) FROM messages WHERE room_id = r.id), 0)
+    """)
+    op.alter_column('messages', 'seq', nullable=False)
+    op.create_index('ux_messages_room_id_seq', 'messages', ['room_id', 'seq'], unique=True)
+
+    # Allocating a sequence number bumps rooms.last_message_seq; only edits
+    # to the room itself should touch updated_at
+    op.execute("DROP TRIGGER IF EXISTS update_rooms_updated_at ON rooms")
+    op.execute("""
+        CREATE TRIGGER update_rooms_updated_at
+        BEFORE UPDATE OF name, description, status, is_public, token ON rooms
+        FOR EACH ROW
+        EXECUTE FUNCTION update_updated_at_column();
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS update_rooms_updated_at ON rooms")
+    op.execute("""
+        CREATE TRIGGER update_rooms_updated_at
+        BEFORE UPDATE ON rooms
+        FOR EACH ROW
+        EXECUTE FUNCTION update_updated_at_column();
+    """)
+    op.drop_index('ux_messages_room_id_seq', table_name='messages')
+    op.drop_column('messages', 'seq')
+    op.drop_column('rooms', 'last_message_seq')
@@ -0,0 +1,27 @@
+"""Add notifications feed index
+
+Revision ID: 8f1b4d7e2a35
+Revises: d6f2a8c4e190
+Create Date: 2026-10-18 21:40:12.552907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '8f1b4d7e2a35'
+down_revision = 'd6f2a8c4e190'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'ix_notifications_user_id_created_at_id',
+        'notifications',
+        ['user_id', 'created_at', 'id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_notifications_user_id_created_at_id', table_name='notifications')
@@ -0,0 +1,38 @@
+"""Add expiry claim column to bets
+
+Revision ID: 9d41b6c8e2f5
+Revises: 2c8e5f3a9d17
+Create Date: 2026-10-18 18:32:14.775902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '9d41b6c8e2f5'
+down_revision = '2c8e5f3a9d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('bets', sa.Column('expiry_notified_at', sa.DateTime(), nullable=True))
+
+    # Decided or rejected bets need no mediator action; anything else that is
+    # already past end_time gets its (never sent) notification on next startup
+    op.execute("""
+        UPDATE bets SET expiry_notified_at = NOW()
+        WHERE result != 'UNKNOWN' OR status = 'REJECTED'
+    """)
+
+    op.create_index(
+        'ix_bets_pending_expiry',
+        'bets',
+        ['end_time'],
+        postgresql_where=sa.text('expiry_notified_at IS NULL')
+    )
+
+
+def downgrade():
+    op.drop_index('ix_bets_pending_expiry', table_name='bets')
+    op.drop_column('bets', 'expiry_notified_at')
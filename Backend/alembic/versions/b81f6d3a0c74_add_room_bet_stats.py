@@ -0,0 +1,65 @@
+"""Add incrementally maintained room bet stats
+
+Revision ID: b81f6d3a0c74
+Revises: 4e7a1c9b3d52
+Create Date: 2026-10-18 19:48:02.604117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b81f6d3a0c74'
+down_revision = '4e7a1c9b3d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'room_bet_stats',
+        sa.Column('room_id', sa.Integer(), nullable=False),
+        sa.Column('bet_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('pending_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('approved_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('rejected_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('open_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('settled_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('open_pot', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('total_staked', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('total_paid', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('room_id')
+    )
+
+    # Seed from the existing bets; past payouts are taken from the ledger
+    op.execute("""
+        INSERT INTO room_bet_stats (
+            room_id, bet_count, pending_count, approved_count, rejected_count,
+            open_count, settled_count, open_pot, total_staked, total_paid, updated_at
+        )
+        SELECT
+            b.room_id,
+            COUNT(*),
+            COUNT(*) FILTER (WHERE b.status = 'PENDING'),
+            COUNT(*) FILTER (WHERE b.status = 'APPROVED'),
+            COUNT(*) FILTER (WHERE b.status = 'REJECTED'),
+            COUNT(*) FILTER (WHERE b.status != 'REJECTED' AND b.result = 'UNKNOWN'),
+            COUNT(*) FILTER (WHERE b.status != 'REJECTED' AND b.result != 'UNKNOWN'),
+            COALESCE(SUM(b.amount) FILTER (WHERE b.status != 'REJECTED' AND b.result = 'UNKNOWN'), 0),
+            COALESCE(SUM(b.amount) FILTER (WHERE b.status != 'REJECTED'), 0),
+            COALESCE(SUM(paid.amount), 0),
+            NOW()
+        FROM bets b
+        LEFT JOIN (
+            SELECT bet_id, SUM(amount) AS amount FROM coin_ledger
+            WHERE reason IN ('BET_PAYOUT', 'BET_REFUND') AND bet_id IS NOT NULL
+            GROUP BY bet_id
+        ) AS paid ON paid.bet_id = b.id AND b.status != 'REJECTED'
+        GROUP BY b.room_id
+    """)
+
+
+def downgrade():
+    op.drop_table('room_bet_stats')
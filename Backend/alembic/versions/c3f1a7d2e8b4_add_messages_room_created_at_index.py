@@ -0,0 +1,31 @@
+"""Add composite index for message history pagination
+
+Revision ID: c3f1a7d2e8b4
+Revises: 20250501_add_description
+Create Date: 2026-10-18 10:12:41.503211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c3f1a7d2e8b4'
+down_revision = '20250501_add_description'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keyset pagination cannot order rows with a NULL key, so backfill
+    # legacy messages that were inserted without a timestamp
+    op.execute("UPDATE messages SET created_at = NOW() WHERE created_at IS NULL")
+
+    op.create_index(
+        'ix_messages_room_id_created_at_id',
+        'messages',
+        ['room_id', 'created_at', 'id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_messages_room_id_created_at_id', table_name='messages')
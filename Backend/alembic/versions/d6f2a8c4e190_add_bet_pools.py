@@ -0,0 +1,50 @@
+"""Add parimutuel bet pools
+
+Revision ID: d6f2a8c4e190
+Revises: 5a3c8e1f7b96
+Create Date: 2026-10-18 21:02:55.918340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd6f2a8c4e190'
+down_revision = '5a3c8e1f7b96'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'bet_pools',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('room_id', sa.Integer(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=False),
+        sa.Column('mediator_id', sa.Integer(), nullable=False),
+        sa.Column('description', sa.String(), nullable=False),
+        sa.Column('outcomes', sa.JSON(), nullable=False),
+        sa.Column('winning_outcome', sa.Integer(), nullable=True),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('settled_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['room_id'], ['rooms.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.ForeignKeyConstraint(['mediator_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_bet_pools_room_id', 'bet_pools', ['room_id'])
+
+    op.add_column('bets', sa.Column('pool_id', sa.Integer(), nullable=True))
+    op.add_column('bets', sa.Column('outcome', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_bets_pool_id', 'bets', 'bet_pools', ['pool_id'], ['id'], ondelete='CASCADE')
+    op.create_index('ix_bets_pool_id_id', 'bets', ['pool_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_bets_pool_id_id', table_name='bets')
+    op.drop_constraint('fk_bets_pool_id', 'bets', type_='foreignkey')
+    op.drop_column('bets', 'outcome')
+    op.drop_column('bets', 'pool_id')
+    op.drop_index('ix_bet_pools_room_id', table_name='bet_pools')
+    op.drop_table('bet_pools')
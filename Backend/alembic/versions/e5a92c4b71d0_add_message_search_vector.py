@@ -0,0 +1,31 @@
+"""Add full-text search vector to messages
+
+Revision ID: e5a92c4b71d0
+Revises: c3f1a7d2e8b4
+Create Date: 2026-10-18 13:47:09.118374
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e5a92c4b71d0'
+down_revision = 'c3f1a7d2e8b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Generated column keeps the vector in sync with content without app changes;
+    # must match SEARCH_CONFIG in app/models/message.py
+    op.execute("""
+        ALTER TABLE messages
+        ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED
+    """)
+    op.execute("CREATE INDEX ix_messages_search_vector ON messages USING GIN (search_vector)")
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_messages_search_vector")
+    op.drop_column('messages', 'search_vector')
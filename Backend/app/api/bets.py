@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, aliased
+import heapq
 import logging
-from typing import List
+from datetime import datetime, timezone
+from itertools import islice
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -10,8 +14,10 @@ try:
     from app.models.bet import Bet, BetStatus, BetResult
     from app.models.room_member import RoomMember, Role
     from app.models.user import User
-    from app.schemas.bet import BetCreate, BetResponse
+    from app.models.room_bet_stats import RoomBetStats
+    from app.schemas.bet import BetCreate, BetResponse, BetSettlementRequest, BetSettlementResponse, RoomBetStatsResponse
     from app.core.auth import get_current_user
+    from app.services.bet_services import bet_expiry_scheduler, bump_room_bet_stats, escrow_coins, review_bet, settle_bets
 except Exception as e:
     logger.error(f"Failed to import dependencies: {str(e)}", exc_info=True)
     raise
@@ -19,6 +25,43 @@ except Exception as e:
 router = APIRouter(tags=["bets"])
 logging.basicConfig(filename='log.txt', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+MAX_PAGE_SIZE = 500
+
+# Helper function to create BetResponse
+def create_bet_response(bet: Bet, user_username: Optional[str], approved_by_username: Optional[str], mediator_username: Optional[str]) -> BetResponse:
+    return BetResponse(
+        id=bet.id,
+        room_id=bet.room_id,
+        user_id=bet.user_id,
+        user_username=user_username or "Unknown",
+        description=bet.description,
+        amount=bet.amount,
+        status=bet.status,
+        result=bet.result,
+        approved_by=bet.approved_by,
+        approved_by_username=approved_by_username,
+        mediator_id=bet.mediator_id,
+        mediator_username=mediator_username or "Unknown",
+        created_at=bet.created_at,
+        start_time=bet.start_time,
+        end_time=bet.end_time
+    )
+
+def bets_with_usernames(db: Session):
+    """Query of (Bet, owner, approver, mediator usernames) in one round-trip."""
+    owner = aliased(User)
+    approver = aliased(User)
+    mediator = aliased(User)
+    return db.query(
+        Bet, owner.username, approver.username, mediator.username
+    ).outerjoin(
+        owner, owner.id == Bet.user_id
+    ).outerjoin(
+        approver, approver.id == Bet.approved_by
+    ).outerjoin(
+        mediator, mediator.id == Bet.mediator_id
+    )
+
 @router.post("/", response_model=BetResponse)
 async def create_bet(
     bet_data: BetCreate,
@@ -54,15 +97,12 @@ async def create_bet(
             raise HTTPException(status_code=404, detail="Mediator not found")
 
         # Verify end_time is in the future
-        from datetime import datetime, timezone
         if bet_data.end_time <= datetime.now(timezone.utc):
             logger.error(f"End time {bet_data.end_time} is not in the future")
             raise HTTPException(status_code=400, detail="End time must be in the future")
 
-        # Check user has enough coins
-        if user.coins < bet_data.amount:
-            logger.error(f"User {user.id} has insufficient coins: {user.coins} < {bet_data.amount}")
-            raise HTTPException(status_code=400, detail="Insufficient coins")
+        # Read before the escrow/commit expires the loaded rows
+        user_username, mediator_username = user.username, mediator.username
 
         bet = Bet(
             room_id=bet_data.room_id,
@@ -76,33 +116,31 @@ async def create_bet(
             end_time=bet_data.end_time
         )
         db.add(bet)
+        db.flush()
+
+        # Hold the stake in the same transaction as the bet insert
+        remaining = escrow_coins(db, user.id, bet_data.amount, bet.id)
+        if remaining is None:
+            db.rollback()
+            logger.error(f"User {user.id} has insufficient coins for a bet of {bet_data.amount}")
+            raise HTTPException(status_code=400, detail="Insufficient coins")
+        bump_room_bet_stats(
+            db, bet_data.room_id,
+            bet_count=1, pending_count=1, open_count=1,
+            open_pot=bet_data.amount, total_staked=bet_data.amount
+        )
+
         db.commit()
         db.refresh(bet)
 
-        # Fetch usernames
-        user_obj = db.query(User).filter(User.id == bet.user_id).first()
-        mediator_obj = db.query(User).filter(User.id == bet.mediator_id).first()
-
-        response = BetResponse(
-            id=bet.id,
-            room_id=bet.room_id,
-            user_id=bet.user_id,
-            user_username=user_obj.username if user_obj else "Unknown",
-            description=bet.description,
-            amount=bet.amount,
-            status=bet.status,
-            result=bet.result,
-            approved_by=bet.approved_by,
-            approved_by_username=None,
-            mediator_id=bet.mediator_id,
-            mediator_username=mediator_obj.username if mediator_obj else "Unknown",
-            created_at=bet.created_at,
-            start_time=bet.start_time,
-            end_time=bet.end_time
-        )
+        bet_expiry_scheduler.schedule(bet.id, bet.end_time)
+
+        response = create_bet_response(bet, user_username, None, mediator_username)
         
-        logger.info(f"Bet {bet.id} created by user {user.id} in room {bet_data.room_id}")
+        logger.info(f"Bet {bet.id} created by user {user.id} in room {bet_data.room_id}, {remaining} coins left")
         return response
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating bet: {str(e)}", exc_info=True)
         db.rollback()
@@ -111,9 +149,16 @@ async def create_bet(
 @router.get("/", response_model=List[BetResponse])
 async def get_bets(
     room_id: int,
+    status: Optional[BetStatus] = None,
+    result: Optional[BetResult] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    before: Optional[int] = Query(None, description="Return bets older than this bet id"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    """List a room's bets, newest first, keyset-paginated on (created_at, id)."""
     try:
         # Verify user is a member of the room
         member = db.query(RoomMember).filter(
@@ -124,33 +169,178 @@ async def get_bets(
             logger.error(f"User {user.id} is not a member of room {room_id}")
             raise HTTPException(status_code=403, detail="User is not a member of this room")
 
-        bets = db.query(Bet).filter(Bet.room_id == room_id).all()
-        responses = []
-        for bet in bets:
-            user_obj = db.query(User).filter(User.id == bet.user_id).first()
-            approver = db.query(User).filter(User.id == bet.approved_by).first() if bet.approved_by else None
-            mediator = db.query(User).filter(User.id == bet.mediator_id).first()
-            response = BetResponse(
-                id=bet.id,
-                room_id=bet.room_id,
-                user_id=bet.user_id,
-                user_username=user_obj.username if user_obj else "Unknown",
-                description=bet.description,
-                amount=bet.amount,
-                status=bet.status,
-                result=bet.result,
-                approved_by=bet.approved_by,
-                approved_by_username=approver.username if approver else None,
-                mediator_id=bet.mediator_id,
-                mediator_username=mediator.username if mediator else "Unknown",
-                created_at=bet.created_at,
-                start_time=bet.start_time,
-                end_time=bet.end_time
-            )
-            responses.append(response)
+        query = bets_with_usernames(db).filter(Bet.room_id == room_id)
+        if status is not None:
+            query = query.filter(Bet.status == status)
+        if result is not None:
+            query = query.filter(Bet.result == result)
+        if created_after is not None:
+            query = query.filter(Bet.created_at >= created_after)
+        if created_before is not None:
+            query = query.filter(Bet.created_at < created_before)
+        if before is not None:
+            anchor = db.query(Bet.created_at, Bet.id).filter(
+                Bet.id == before,
+                Bet.room_id == room_id
+            ).first()
+            if not anchor:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            query = query.filter(tuple_(Bet.created_at, Bet.id) < tuple_(anchor.created_at, anchor.id))
+
+        rows = query.order_by(Bet.created_at.desc(), Bet.id.desc()).limit(limit).all()
+        responses = [
+            create_bet_response(bet, user_username, approved_by_username, mediator_username)
+            for bet, user_username, approved_by_username, mediator_username in rows
+        ]
         
-        logger.info(f"User {user.id} fetched {len(bets)} bets for room {room_id}")
+        logger.info(f"User {user.id} fetched {len(responses)} bets for room {room_id}")
         return responses
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching bets for room {room_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.get("/mediating", response_model=List[BetResponse])
+async def get_mediating_bets(
+    after: Optional[int] = Query(None, description="Return bets due after this bet id"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The caller's mediator queue: unresolved bets awaiting approval or past end_time.
+
+    Ordered by (end_time, id), most overdue first, and keyset-paginated.
+    Pending bets and overdue approved bets are read as two range scans of
+    ix_bets_mediator_queue, each already in end_time order, and merged;
+    a single `status = PENDING OR end_time <= now` filter would make the
+    planner scan both statuses and sort.
+    """
+    try:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        anchor = None
+        if after is not None:
+            anchor = db.query(Bet.end_time, Bet.id).filter(
+                Bet.id == after,
+                Bet.mediator_id == user.id
+            ).first()
+            if not anchor:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        def queue_page(*conditions):
+            query = bets_with_usernames(db).filter(
+                Bet.mediator_id == user.id,
+                Bet.result == BetResult.UNKNOWN,
+                Bet.pool_id.is_(None),  # Pool stakes are settled per pool
+                *conditions
+            )
+            if anchor is not None:
+                query = query.filter(tuple_(Bet.end_time, Bet.id) > tuple_(anchor.end_time, anchor.id))
+            return query.order_by(Bet.end_time, Bet.id).limit(limit).all()
+
+        pending = queue_page(Bet.status == BetStatus.PENDING)
+        overdue = queue_page(Bet.status == BetStatus.APPROVED, Bet.end_time <= now)
+        rows = list(islice(heapq.merge(pending, overdue, key=lambda row: (row[0].end_time, row[0].id)), limit))
+        responses = [
+            create_bet_response(bet, user_username, approved_by_username, mediator_username)
+            for bet, user_username, approved_by_username, mediator_username in rows
+        ]
+
+        logger.info(f"User {user.id} fetched {len(responses)} bets from their mediator queue")
+        return responses
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching mediator queue for user {user.id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.get("/stats", response_model=RoomBetStatsResponse)
+async def get_room_bet_stats(
+    room_id: int,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Running bet totals for a room, read from its RoomBetStats row."""
+    try:
+        member = db.query(RoomMember).filter(
+            RoomMember.room_id == room_id,
+            RoomMember.user_id == user.id
+        ).first()
+        if not member:
+            logger.error(f"User {user.id} is not a member of room {room_id}")
+            raise HTTPException(status_code=403, detail="User is not a member of this room")
+
+        stats = db.get(RoomBetStats, room_id)
+        if stats is None:
+            return RoomBetStatsResponse(room_id=room_id)
+        return stats
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching bet stats for room {room_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+async def _review(bet_id: int, approve: bool, user: User, db: Session) -> BetResponse:
+    action = "approve" if approve else "reject"
+    try:
+        if review_bet(db, bet_id, user.id, approve) is None:
+            db.rollback()
+            bet = db.query(Bet).filter(Bet.id == bet_id).first()
+            if not bet:
+                raise HTTPException(status_code=404, detail="Bet not found")
+            if bet.mediator_id != user.id:
+                logger.error(f"User {user.id} tried to {action} bet {bet_id} mediated by {bet.mediator_id}")
+                raise HTTPException(status_code=403, detail="Only the mediator can review this bet")
+            raise HTTPException(status_code=409, detail="Bet has already been reviewed or settled")
+        db.commit()
+
+        bet, user_username, approved_by_username, mediator_username = bets_with_usernames(db).filter(Bet.id == bet_id).one()
+        logger.info(f"User {user.id} {action}d bet {bet_id}")
+        return create_bet_response(bet, user_username, approved_by_username, mediator_username)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error trying to {action} bet {bet_id}: {str(e)}", exc_info=True)
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.post("/{bet_id}/approve", response_model=BetResponse)
+async def approve_bet(bet_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Approve a pending bet; only its mediator may."""
+    return await _review(bet_id, True, user, db)
+
+@router.post("/{bet_id}/reject", response_model=BetResponse)
+async def reject_bet(bet_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Reject a pending bet and refund its stake; only its mediator may."""
+    return await _review(bet_id, False, user, db)
+
+@router.post("/settle", response_model=BetSettlementResponse)
+async def settle_room_bets(
+    settlement: BetSettlementRequest,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Resolve and pay out the caller's mediated bets in a room in one transaction."""
+    try:
+        if not settlement.results:
+            raise HTTPException(status_code=400, detail="No results to settle")
+        try:
+            summary = settle_bets(
+                db,
+                settlement.room_id,
+                {bet_id: BetResult(result.value) for bet_id, result in settlement.results.items()},
+                mediator_id=user.id,
+                mode=settlement.mode
+            )
+        except ValueError as ve:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(ve))
+        db.commit()
+        logger.info(f"User {user.id} settled {summary['settled']} bets in room {settlement.room_id}")
+        return summary
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error settling bets in room {settlement.room_id}: {str(e)}", exc_info=True)
+        db.rollback()
         raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
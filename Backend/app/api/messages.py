@@ -1,16 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 from typing import Dict, List, Optional
+import asyncio
 import logging
 import json
 from pusher import Pusher
-from app.core.database import get_db
+from app.core.database import get_db, SessionLocal
 from app.models.message import Message
 from app.models.user import User
 from app.models.room import Room
-from app.schemas.message import MessageCreate, MessageResponse, TestMessageCreate
+from app.schemas.message import MessageCreate, MessageResponse, MessageSearchPage, TestMessageCreate
 from app.core.auth import get_current_user
-from app.core.pusher import get_pusher, PusherService
+from app.core.pusher import get_pusher, PusherService, dispatcher
+from app.core.hub import Frame, RoomHub
+from app.core.broadcast import broadcast
+from app.services.message_services import (
+    allocate_message_seqs,
+    export_room_messages,
+    message_buffer,
+    message_cache,
+    message_event,
+    messages_since,
+    search_room_messages
+)
+from app.config import settings
 from datetime import datetime, timezone
 
 router = APIRouter()
@@ -21,32 +36,21 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, WebSocket] = {}
-
-    async def connect(self, room_id: int, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[room_id] = websocket
-        logger.info(f"New WebSocket connection for room {room_id}")
-
-    def disconnect(self, room_id: int):
-        if room_id in self.active_connections:
-            del self.active_connections[room_id]
-            logger.info(f"WebSocket connection closed for room {room_id}")
+MAX_PAGE_SIZE = 200
+# Larger gaps on WebSocket resume are answered with "resync-required"
+MAX_RESUME_REPLAY = 1000
 
-    async def send_personal_message(self, message: str, room_id: int):
-        if room_id in self.active_connections:
-            await self.active_connections[room_id].send_text(message)
-
-manager = ConnectionManager()
+manager = RoomHub()
+# Every worker's hub receives room events published by any worker
+broadcast.subscribe(manager.publish)
+broadcast.subscribe(message_cache.on_broadcast)
+broadcast.on_reconnect(message_cache.clear)
 
 @router.post("/", response_model=MessageResponse)
 async def send_message(
     message: MessageCreate,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    pusher_service: PusherService = Depends(get_pusher)
+    db: Session = Depends(get_db)
 ):
     """Send a message to a room."""
     try:
@@ -75,27 +79,33 @@ async def send_message(
             content=message.content,
             created_at=datetime.now(timezone.utc)
         )
-        db.add(db_message)
-        db.commit()
-        db.refresh(db_message)
-        logger.info(f"Message created: {db_message.id}")
+        if settings.message_group_commit:
+            # Shares one INSERT/COMMIT with other messages from this flush window
+            db_message.id, db_message.created_at, db_message.seq = await message_buffer.submit(
+                db_message.room_id, db_message.user_id, db_message.content, db_message.created_at
+            )
+        else:
+            db_message.seq = allocate_message_seqs(db, message.room_id)
+            db.add(db_message)
+            db.commit()
+            db.refresh(db_message)
+        logger.info(f"Message created: {db_message.id} (seq {db_message.seq})")
 
         # Ensure created_at is not None
-        created_at = db_message.created_at or datetime.now(timezone.utc)
-        
-        pusher_response = pusher_service.client.trigger(
-            f"room-{message.room_id}",
-            "new-message",
-            {
-                "id": db_message.id,
-                "room_id": db_message.room_id,
-                "user_id": db_message.user_id,
-                "content": db_message.content,
-                "created_at": created_at.isoformat(),
-                "username": user.username  # Send username for frontend display
-            }
-        )
-        logger.debug(f"Pusher trigger response for room-{message.room_id}: {pusher_response}")
+        if db_message.created_at is None:
+            db_message.created_at = datetime.now(timezone.utc)
+
+        event = message_event(db_message, user.username)  # Send username for frontend display
+        # The message is already committed; a failed publish must not report it as failed
+        try:
+            await broadcast.publish(message.room_id, json.dumps({"event": "new-message", "data": event}))
+        except Exception as e:
+            logger.error(f"Failed to broadcast message {db_message.id} to room {message.room_id}: {str(e)}", exc_info=True)
+            # This worker's tail would never see the message
+            message_cache.evict_room(message.room_id)
+        # Delivered by the dispatcher's workers; never wait on Pusher here
+        if not dispatcher.enqueue(f"room-{message.room_id}", "new-message", event):
+            logger.warning(f"Pusher event for message {db_message.id} was dropped")
 
         # Set username in response
         db_message.username = user.username
@@ -112,12 +122,23 @@ async def send_message(
 @router.get("/room/{room_id}", response_model=List[MessageResponse])
 async def get_room_messages(
     room_id: int,
+    before: Optional[int] = Query(None, description="Return messages older than this message id"),
+    after: Optional[int] = Query(None, description="Return messages newer than this message id"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Retrieve all messages in a room."""
+    """Retrieve a page of messages in a room, oldest first.
+
+    Pages are keyed on (created_at, id). Without a cursor the newest `limit`
+    messages are returned; `before`/`after` take the id of a message from a
+    previously fetched page.
+    """
     try:
-        logger.debug(f"Fetching messages for room {room_id} by user {user.id}")
+        logger.debug(f"Fetching messages for room {room_id} by user {user.id} (before={before}, after={after}, limit={limit})")
+        if before is not None and after is not None:
+            raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+
         room = db.query(Room).get(room_id)
         if not room:
             logger.warning(f"Room not found: {room_id}")
@@ -132,23 +153,61 @@ async def get_room_messages(
             logger.warning(f"User {user.id} not member of room {room_id}")
             raise HTTPException(status_code=403, detail="You are not a member of this room")
 
-        messages = db.query(Message).filter(
-            Message.room_id == room_id
-        ).order_by(
-            Message.created_at.asc()
-        ).all()
-        
-        # Ensure created_at is not None and set username
-        for message in messages:
-            if message.created_at is None:
-                message.created_at = datetime.now(timezone.utc)
-                db.add(message)
+        cursor_id = before if before is not None else after
+        fetch_limit = limit
+        if cursor_id is None:
+            cached = message_cache.get(room_id, limit)
+            if cached is not None:
+                logger.info(f"Served {len(cached)} messages for room {room_id} from cache")
+                return cached
+            # Read a full cache tail so the next request for this room is a hit
+            fetch_limit = max(limit, message_cache.room_size)
+
+        # Resolve authors in the same round-trip instead of one User lookup per message
+        query = db.query(Message, User.username).outerjoin(
+            User, User.id == Message.user_id
+        ).filter(Message.room_id == room_id)
+        if cursor_id is not None:
+            anchor = db.query(Message.created_at, Message.id).filter(
+                Message.id == cursor_id,
+                Message.room_id == room_id
+            ).first()
+            if not anchor:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            key = tuple_(Message.created_at, Message.id)
+            if after is not None:
+                query = query.filter(key > tuple_(anchor.created_at, anchor.id))
+            else:
+                query = query.filter(key < tuple_(anchor.created_at, anchor.id))
+
+        if after is not None:
+            rows = query.order_by(
+                Message.created_at.asc(), Message.id.asc()
+            ).limit(limit).all()
+        else:
+            # Walk the index backwards from the newest message, then flip the
+            # page so callers always receive it in chronological order.
+            rows = query.order_by(
+                Message.created_at.desc(), Message.id.desc()
+            ).limit(fetch_limit).all()
+            rows.reverse()
+
+        # Read-only: username is a transient attribute, nothing is flushed
+        messages = []
+        for message, username in rows:
             if message.user_id is None:
                 message.username = "SodaBot"  # System messages
             else:
-                user = db.query(User).filter(User.id == message.user_id).first()
-                message.username = user.username if user else "Unknown"
-        db.commit()
+                message.username = username or "Unknown"
+            messages.append(message)
+
+        if cursor_id is None:
+            message_cache.seed(
+                room_id,
+                [MessageResponse.model_validate(m) for m in messages],
+                complete=len(messages) < fetch_limit
+            )
+            messages = messages[-limit:]
         
         logger.info(f"Retrieved {len(messages)} messages for room {room_id}")
         return messages
@@ -160,26 +219,179 @@ async def get_room_messages(
         logger.error(f"Unexpected error in get_room_messages: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to retrieve messages: {str(e)}")
 
+@router.get("/room/{room_id}/sync", response_model=List[MessageResponse])
+async def sync_room_messages(
+    room_id: int,
+    since_seq: int = Query(..., ge=0, description="Highest seq the client already has"),
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Messages a client missed, i.e. with seq > since_seq, in seq order.
+
+    A full page means there may be more; call again with the last seq.
+    """
+    try:
+        logger.debug(f"Syncing room {room_id} for user {user.id} since seq {since_seq}")
+        from app.models.room_member import RoomMember
+        membership = db.query(RoomMember).filter(
+            RoomMember.room_id == room_id,
+            RoomMember.user_id == user.id
+        ).first()
+        if not membership:
+            logger.warning(f"User {user.id} not member of room {room_id}")
+            raise HTTPException(status_code=403, detail="You are not a member of this room")
+
+        messages = []
+        for message, username in messages_since(db, room_id, since_seq, limit):
+            message.username = "SodaBot" if message.user_id is None else (username or "Unknown")
+            messages.append(message)
+        logger.info(f"Synced {len(messages)} messages for room {room_id} since seq {since_seq}")
+        return messages
+
+    except HTTPException as he:
+        logger.error(f"HTTP error in sync_room_messages: {str(he)}")
+        raise he
+    except Exception as e:
+        logger.error(f"Unexpected error in sync_room_messages: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to sync messages: {str(e)}")
+
+@router.get("/room/{room_id}/search", response_model=MessageSearchPage)
+async def search_messages(
+    room_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Full-text search of a room's messages, best matches first."""
+    try:
+        logger.debug(f"Searching room {room_id} by user {user.id}: q={q!r}")
+        if not q.split():
+            raise HTTPException(status_code=422, detail="Search query has no terms")
+        from app.models.room_member import RoomMember
+        membership = db.query(RoomMember).filter(
+            RoomMember.room_id == room_id,
+            RoomMember.user_id == user.id
+        ).first()
+        if not membership:
+            logger.warning(f"User {user.id} not member of room {room_id}")
+            raise HTTPException(status_code=403, detail="You are not a member of this room")
+
+        try:
+            page = search_room_messages(db, room_id, q, limit, cursor)
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        logger.info(f"Search in room {room_id} returned {len(page.results)} messages")
+        return page
+
+    except HTTPException as he:
+        logger.error(f"HTTP error in search_messages: {str(he)}")
+        raise he
+    except Exception as e:
+        logger.error(f"Unexpected error in search_messages: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to search messages: {str(e)}")
+
+@router.get("/room/{room_id}/export")
+async def export_messages(
+    room_id: int,
+    gzip: bool = Query(False, description="Gzip-compress the stream"),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stream a room's entire history as NDJSON, one message per line."""
+    try:
+        logger.debug(f"Exporting room {room_id} for user {user.id} (gzip={gzip})")
+        from app.models.room_member import RoomMember
+        membership = db.query(RoomMember).filter(
+            RoomMember.room_id == room_id,
+            RoomMember.user_id == user.id
+        ).first()
+        if not membership:
+            logger.warning(f"User {user.id} not member of room {room_id}")
+            raise HTTPException(status_code=403, detail="You are not a member of this room")
+
+        filename = f"room-{room_id}.ndjson" + (".gz" if gzip else "")
+        logger.info(f"Streaming export of room {room_id} to user {user.id}")
+        return StreamingResponse(
+            export_room_messages(room_id, compress=gzip),
+            media_type="application/gzip" if gzip else "application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+
+    except HTTPException as he:
+        logger.error(f"HTTP error in export_messages: {str(he)}")
+        raise he
+    except Exception as e:
+        logger.error(f"Unexpected error in export_messages: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to export messages: {str(e)}")
+
 @router.websocket("/ws/{room_id}")
 async def websocket_messages(
     websocket: WebSocket,
     room_id: int,
-    token: str = None
+    token: str = None,
+    last_seq: Optional[int] = None
 ):
-    """WebSocket endpoint for real-time messaging in a room."""
-    await manager.connect(room_id, websocket)
+    """WebSocket endpoint for real-time messaging in a room.
+
+    The socket is receive-only for clients: new messages are posted through
+    `send_message` and fanned out to every subscriber of the room. A client
+    reconnecting with `last_seq` first receives one "replay" frame with the
+    messages it missed, then the live stream. Clients offering the
+    `sodacan.msgpack.v1` subprotocol get binary MessagePack frames.
+    """
+    from app.models.room_member import RoomMember
+    db = SessionLocal()
+    try:
+        try:
+            user = get_current_user(token=token, db=db) if token else None
+        except HTTPException:
+            user = None
+        membership = user and db.query(RoomMember).filter(
+            RoomMember.room_id == room_id,
+            RoomMember.user_id == user.id
+        ).first()
+        if not membership:
+            logger.warning(f"Rejected WebSocket connection for room {room_id}")
+            await websocket.close(code=1008)
+            return
+
+        # Subscribe before reading the gap so nothing falls between replay and live
+        subscriber = await manager.connect(room_id, websocket, paused=last_seq is not None)
+        if last_seq is not None:
+            try:
+                rows = messages_since(db, room_id, last_seq, MAX_RESUME_REPLAY + 1)
+                if len(rows) > MAX_RESUME_REPLAY:
+                    await subscriber.send(Frame.from_event({"event": "resync-required"}))
+                    subscriber.start()
+                else:
+                    events = [
+                        message_event(m, "SodaBot" if m.user_id is None else (username or "Unknown"))
+                        for m, username in rows
+                    ]
+                    await subscriber.send(Frame.from_event({"event": "replay", "data": events}))
+                    subscriber.start(last_sent_seq=events[-1]["seq"] if events else last_seq)
+            except Exception as e:
+                manager.disconnect(subscriber)
+                logger.error(f"WebSocket resume failed for room {room_id}: {str(e)}", exc_info=True)
+                await websocket.close(code=1011)
+                return
+            logger.info(f"Resumed room {room_id} from seq {last_seq}, replayed {len(rows)} messages")
+    finally:
+        db.close()
     
     try:
         while True:
             data = await websocket.receive_text()
-            logger.info(f"Received WebSocket message for room {room_id}: {data}")
-            await manager.send_personal_message(f"You said: {data}", room_id)
+            logger.debug(f"Ignoring inbound WebSocket frame for room {room_id}: {data[:100]}")
             
     except WebSocketDisconnect:
-        manager.disconnect(room_id)
+        manager.disconnect(subscriber)
         logger.info(f"Client disconnected from room {room_id}")
     except Exception as e:
-        manager.disconnect(room_id)
+        manager.disconnect(subscriber)
         logger.error(f"WebSocket error for room {room_id}: {str(e)}", exc_info=True)
         await websocket.close(code=1011)
 
@@ -191,7 +403,8 @@ async def send_test_message(
     """Endpoint for testing Pusher messages (dev only)"""
     try:
         created_at = datetime.now(timezone.utc)
-        pusher_response = pusher_service.client.trigger(
+        pusher_response = await asyncio.to_thread(
+            pusher_service.client.trigger,
             f"room-{test_message.room_id}",
             "new-message",
             {
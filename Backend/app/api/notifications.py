@@ -1,48 +1,157 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.database import get_db, SessionLocal
+from app.core.broadcast import USER_SCOPE, broadcast
+from app.core.hub import RoomHub
 from app.models.notification import Notification  # Import from models
 from app.models.bet import Bet, BetStatus
 from app.core.auth import get_current_user
 from app.models.user import User
+from app.schemas.notification import NotificationResolveRequest, NotificationResolveResponse, NotificationResponse
+from app.services.notification_services import create_bet_result_notification  # Re-exported for existing callers
+from app.services.notification_services import resolve_notifications, unread_cache
+import json
 import logging
 from datetime import datetime, timezone
+from typing import List, Optional
 
 router = APIRouter()
 logging.basicConfig(filename='log.txt', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
-@router.get("/")
-async def get_notifications(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Fetch notifications for the authenticated user."""
+MAX_PAGE_SIZE = 200
+
+# Per-user push channels; the hub's "rooms" are keyed by user id here
+notification_hub = RoomHub()
+broadcast.subscribe(notification_hub.publish, scope=USER_SCOPE)
+broadcast.subscribe(unread_cache.on_broadcast, scope=USER_SCOPE)
+
+@router.get("/", response_model=List[NotificationResponse])
+async def get_notifications(
+    unresolved_only: bool = False,
+    before: Optional[int] = Query(None, description="Return notifications older than this notification id"),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The authenticated user's notifications, newest first, keyset-paginated on (created_at, id)."""
     try:
-        notifications = db.query(Notification).filter(
-            Notification.user_id == user.id
-        ).all()
-        for n in notifications:
-            if n.bet_id:
-                bet = db.query(Bet).filter(Bet.id == n.bet_id).first()
-                n.bet_description = bet.description if bet else None
+        query = db.query(Notification, Bet.description).outerjoin(
+            Bet, Bet.id == Notification.bet_id
+        ).filter(Notification.user_id == user.id)
+        if unresolved_only:
+            query = query.filter(Notification.resolved.isnot(True))
+        if before is not None:
+            anchor = db.query(Notification.created_at, Notification.id).filter(
+                Notification.id == before,
+                Notification.user_id == user.id
+            ).first()
+            if not anchor:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            query = query.filter(
+                tuple_(Notification.created_at, Notification.id) < tuple_(anchor.created_at, anchor.id)
+            )
+
+        rows = query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit).all()
+        notifications = [
+            NotificationResponse(
+                id=n.id,
+                user_id=n.user_id,
+                bet_id=n.bet_id,
+                type=n.type,
+                message=n.message,
+                created_at=n.created_at,
+                resolved=bool(n.resolved),
+                bet_description=bet_description
+            )
+            for n, bet_description in rows
+        ]
         logging.info(f"User {user.id} fetched {len(notifications)} notifications")
         return notifications
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error fetching notifications for user {user.id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
-# Keep this function here or move to services/notifications.py if used elsewhere
-def create_bet_result_notification(bet: Bet, db: Session):
-    """Create a notification for the moderator when a bet timer expires."""
+@router.get("/unread-count")
+async def get_unread_count(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """The caller's unresolved notification count, from the counters table via an in-process cache."""
+    try:
+        return {"unread": unread_cache.get(db, user.id)}
+    except Exception as e:
+        logging.error(f"Error fetching unread count for user {user.id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.post("/resolve", response_model=NotificationResolveResponse)
+async def resolve(
+    request: NotificationResolveRequest,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Mark notifications resolved by id, everything before a feed cursor, or all at once."""
     try:
-        notification = Notification(
-            user_id=bet.mediator_id,
-            bet_id=bet.id,
-            type="bet_result",
-            message=f"Bet '{bet.description}' has ended. Please select the winner.",
-            created_at=datetime.now(timezone.utc),
-            resolved=False
+        anchor = None
+        if request.before is not None:
+            anchor = db.query(Notification.created_at, Notification.id).filter(
+                Notification.id == request.before,
+                Notification.user_id == user.id
+            ).first()
+            if not anchor:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        resolved, unresolved = resolve_notifications(
+            db, user.id,
+            ids=request.ids,
+            before=(anchor.created_at, anchor.id) if anchor else None
         )
-        db.add(notification)
         db.commit()
-        logging.info(f"Notification created for bet {bet.id} for mediator {bet.mediator_id}")
+        # Don't wait for the broadcast round-trip to drop this worker's count
+        unread_cache.invalidate(user.id)
+
+        # Let the user's other open clients refresh their badge
+        broadcast.publish_nowait(user.id, json.dumps({
+            "event": "notifications-resolved",
+            "data": {"resolved": resolved, "unresolved": unresolved}
+        }), scope=USER_SCOPE)
+        logging.info(f"User {user.id} resolved {resolved} notifications, {unresolved} left")
+        return NotificationResolveResponse(resolved=resolved, unresolved=unresolved)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error resolving notifications for user {user.id}: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.websocket("/ws")
+async def websocket_notifications(websocket: WebSocket, token: str = None):
+    """Push channel for the authenticated user's new notifications.
+
+    Receive-only: each "notification" frame carries one row as soon as its
+    writer commits, so clients no longer poll the feed. After a reconnect,
+    catch up with one `GET /api/notifications/` page.
+    """
+    db = SessionLocal()
+    try:
+        try:
+            user = get_current_user(token=token, db=db) if token else None
+        except HTTPException:
+            user = None
+        if not user:
+            logging.warning("Rejected notifications WebSocket connection")
+            await websocket.close(code=1008)
+            return
+        user_id = user.id
+    finally:
+        db.close()
+
+    subscriber = await notification_hub.connect(user_id, websocket)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        notification_hub.disconnect(subscriber)
+        logging.info(f"Notifications channel closed for user {user_id}")
     except Exception as e:
-        logging.error(f"Error creating notification for bet {bet.id}: {str(e)}")
-        db.rollback()
\ No newline at end of file
+        notification_hub.disconnect(subscriber)
+        logging.error(f"Notifications WebSocket error for user {user_id}: {str(e)}")
+        await websocket.close(code=1011)
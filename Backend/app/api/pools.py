@@ -0,0 +1,252 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+import json
+import logging
+from datetime import datetime, timezone
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+try:
+    from app.core.database import get_db
+    from app.core.broadcast import broadcast
+    from app.models.bet import Bet, BetStatus, BetResult
+    from app.models.bet_pool import BetPool
+    from app.models.room_member import RoomMember
+    from app.models.user import User
+    from app.schemas.bet import BetSettlementResponse
+    from app.schemas.pool import PoolCreate, PoolOutcome, PoolResponse, PoolSettleRequest, StakeCreate
+    from app.core.auth import get_current_user
+    from app.services.bet_services import bump_room_bet_stats, escrow_coins, utc_naive
+    from app.services.notification_services import fan_out_room_notification, publish_notifications
+    from app.services.pool_services import PoolBook, pool_cache, settle_pool
+except Exception as e:
+    logger.error(f"Failed to import dependencies: {str(e)}", exc_info=True)
+    raise
+
+router = APIRouter(tags=["pools"])
+logging.basicConfig(filename='log.txt', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+MAX_PAGE_SIZE = 100
+
+broadcast.subscribe(pool_cache.on_broadcast)
+
+def create_pool_response(pool: BetPool, book: PoolBook, user_id: int) -> PoolResponse:
+    odds = book.odds()
+    position = book.position(user_id)
+    return PoolResponse(
+        id=pool.id,
+        room_id=pool.room_id,
+        description=pool.description,
+        mediator_id=pool.mediator_id,
+        end_time=pool.end_time,
+        created_at=pool.created_at,
+        winning_outcome=pool.winning_outcome,
+        pot=book.pot,
+        stake_count=book.size,
+        outcomes=[
+            PoolOutcome(
+                index=index,
+                label=label,
+                total=book.totals[index],
+                odds=odds[index],
+                your_stake=position[index][0],
+                your_payout=position[index][1]
+            )
+            for index, label in enumerate(pool.outcomes)
+        ]
+    )
+
+def require_member(db: Session, room_id: int, user: User):
+    member = db.query(RoomMember).filter(
+        RoomMember.room_id == room_id,
+        RoomMember.user_id == user.id
+    ).first()
+    if not member:
+        logger.error(f"User {user.id} is not a member of room {room_id}")
+        raise HTTPException(status_code=403, detail="User is not a member of this room")
+
+@router.post("/", response_model=PoolResponse)
+async def create_pool(pool_data: PoolCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Open a parimutuel pool in a room."""
+    try:
+        require_member(db, pool_data.room_id, user)
+        if not db.query(User.id).filter(User.id == pool_data.mediator_id).first():
+            logger.error(f"Mediator {pool_data.mediator_id} not found")
+            raise HTTPException(status_code=404, detail="Mediator not found")
+        if pool_data.end_time <= datetime.now(timezone.utc):
+            raise HTTPException(status_code=400, detail="End time must be in the future")
+
+        pool = BetPool(
+            room_id=pool_data.room_id,
+            created_by=user.id,
+            mediator_id=pool_data.mediator_id,
+            description=pool_data.description,
+            outcomes=pool_data.outcomes,
+            end_time=utc_naive(pool_data.end_time)
+        )
+        db.add(pool)
+        db.commit()
+        db.refresh(pool)
+
+        logger.info(f"Pool {pool.id} with {len(pool.outcomes)} outcomes created by user {user.id} in room {pool.room_id}")
+        return create_pool_response(pool, pool_cache.get(db, pool), user.id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating pool: {str(e)}", exc_info=True)
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.get("/", response_model=List[PoolResponse])
+async def get_pools(
+    room_id: int,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """A room's pools with live odds, newest first."""
+    try:
+        require_member(db, room_id, user)
+        pools = db.query(BetPool).filter(BetPool.room_id == room_id).order_by(BetPool.id.desc()).limit(limit).all()
+        return [create_pool_response(pool, pool_cache.get(db, pool), user.id) for pool in pools]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching pools for room {room_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.get("/{pool_id}", response_model=PoolResponse)
+async def get_pool(pool_id: int, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """A pool's live odds and the caller's projected payouts."""
+    try:
+        pool = db.get(BetPool, pool_id)
+        if not pool:
+            raise HTTPException(status_code=404, detail="Pool not found")
+        require_member(db, pool.room_id, user)
+        return create_pool_response(pool, pool_cache.get(db, pool), user.id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching pool {pool_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.post("/{pool_id}/stakes", response_model=PoolResponse)
+async def place_stake(pool_id: int, stake: StakeCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Back one outcome of an open pool; the stake is escrowed like any bet."""
+    try:
+        # Shared lock: stakes run concurrently, settlement waits for them
+        pool = db.query(BetPool).filter(BetPool.id == pool_id).with_for_update(read=True).first()
+        if not pool:
+            raise HTTPException(status_code=404, detail="Pool not found")
+        require_member(db, pool.room_id, user)
+        if pool.winning_outcome is not None or pool.end_time <= utc_naive(datetime.now(timezone.utc)):
+            raise HTTPException(status_code=409, detail="Pool is closed")
+        if stake.outcome >= len(pool.outcomes):
+            raise HTTPException(status_code=400, detail="Unknown outcome")
+
+        now = datetime.now(timezone.utc)
+        bet = Bet(
+            room_id=pool.room_id,
+            user_id=user.id,
+            description=pool.description,
+            amount=stake.amount,
+            status=BetStatus.APPROVED,
+            result=BetResult.UNKNOWN,
+            mediator_id=pool.mediator_id,
+            end_time=pool.end_time,
+            # Stakes are settled with their pool, never notified one by one
+            expiry_notified_at=now,
+            pool_id=pool.id,
+            outcome=stake.outcome
+        )
+        db.add(bet)
+        db.flush()
+        if escrow_coins(db, user.id, stake.amount, bet.id) is None:
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Insufficient coins")
+        bump_room_bet_stats(
+            db, pool.room_id,
+            bet_count=1, approved_count=1, open_count=1,
+            open_pot=stake.amount, total_staked=stake.amount
+        )
+        db.commit()
+
+        stake_event = {
+            "pool_id": pool.id,
+            "bet_id": bet.id,
+            "user_id": user.id,
+            "outcome": stake.outcome,
+            "amount": stake.amount
+        }
+        book = pool_cache.get(db, pool)
+        book.add(bet.id, user.id, stake.outcome, stake.amount)
+        stake_event["odds"] = book.odds()
+        try:
+            await broadcast.publish(pool.room_id, json.dumps({"event": "pool-stake", "data": stake_event}))
+        except Exception as e:
+            logger.error(f"Failed to broadcast stake {bet.id} to room {pool.room_id}: {str(e)}", exc_info=True)
+
+        logger.info(f"User {user.id} staked {stake.amount} on outcome {stake.outcome} of pool {pool.id}")
+        return create_pool_response(pool, book, user.id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error placing stake in pool {pool_id}: {str(e)}", exc_info=True)
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.post("/{pool_id}/settle", response_model=BetSettlementResponse)
+async def settle_pool_endpoint(
+    pool_id: int,
+    settlement: PoolSettleRequest,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Close a pool on its winning outcome and pay out every stake; only its mediator may."""
+    try:
+        pool = db.get(BetPool, pool_id)
+        if not pool:
+            raise HTTPException(status_code=404, detail="Pool not found")
+        if pool.mediator_id != user.id:
+            logger.error(f"User {user.id} tried to settle pool {pool_id} mediated by {pool.mediator_id}")
+            raise HTTPException(status_code=403, detail="Only the mediator can settle this pool")
+        if settlement.winning_outcome >= len(pool.outcomes):
+            raise HTTPException(status_code=400, detail="Unknown outcome")
+        if pool.end_time > utc_naive(datetime.now(timezone.utc)):
+            raise HTTPException(status_code=409, detail="Pool is still open")
+
+        summary = settle_pool(db, pool, settlement.winning_outcome, user.id)
+        if summary is None:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Pool is already settled")
+        db.commit()
+
+        pool_cache.evict_pool(pool_id)
+        try:
+            await broadcast.publish(pool.room_id, json.dumps({
+                "event": "pool-settled",
+                "data": {"pool_id": pool_id, "winning_outcome": settlement.winning_outcome}
+            }))
+        except Exception as e:
+            logger.error(f"Failed to broadcast settlement of pool {pool_id}: {str(e)}", exc_info=True)
+
+        # The payout is already committed; a failed fan-out must not report it as failed
+        try:
+            created = fan_out_room_notification(
+                db, pool.room_id, "pool_settled",
+                f"Pool '{pool.description}' settled: {pool.outcomes[settlement.winning_outcome]} won."
+            )
+            db.commit()
+            publish_notifications(created)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to notify room {pool.room_id} of pool {pool_id} settlement: {str(e)}", exc_info=True)
+        logger.info(f"User {user.id} settled pool {pool_id} on outcome {settlement.winning_outcome}")
+        return summary
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error settling pool {pool_id}: {str(e)}", exc_info=True)
+        db.rollback()
+        raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -15,6 +15,14 @@ try:
     from app.models.user import User
     from app.schemas.room import RoomCreate, RoomResponse, RoomMemberOut
     from app.core.auth import get_current_user
+    from app.services.bet_services import refund_room_bets
+    from app.services.message_services import message_cache
+    from app.services.notification_services import (
+        discount_room_bet_notifications,
+        fan_out_room_notification,
+        publish_notifications,
+        publish_unread_counts
+    )
 except Exception as e:
     logger.error(f"Failed to import dependencies: {str(e)}", exc_info=True)
     raise
@@ -362,8 +370,18 @@ async def delete_public_room(
             logger.error(f"User {user.id} is not the creator of room {room_id}")
             raise HTTPException(status_code=403, detail="Only the creator can delete the room")
         
+        created = fan_out_room_notification(
+            db, room_id, "room_closed", f"Room '{room.name}' was closed by its creator.",
+            exclude_user_id=user.id
+        )
+        discounted = discount_room_bet_notifications(db, room_id)
+        # Stakes were escrowed; the cascade below would destroy them
+        refund_room_bets(db, room_id)
         db.delete(room)
         db.commit()
+        publish_notifications(created)
+        publish_unread_counts(discounted)
+        message_cache.evict_room(room_id)
         logger.info(f"Public room {room_id} deleted by user {user.id}")
         return {"message": "Room deleted successfully"}
 
@@ -391,8 +409,19 @@ async def delete_private_room(
             logger.error(f"User {user.id} is not the creator of room {room.id}")
             raise HTTPException(status_code=403, detail="Only the creator can delete the room")
         
+        room_id = room.id
+        created = fan_out_room_notification(
+            db, room_id, "room_closed", f"Room '{room.name}' was closed by its creator.",
+            exclude_user_id=user.id
+        )
+        discounted = discount_room_bet_notifications(db, room_id)
+        # Stakes were escrowed; the cascade below would destroy them
+        refund_room_bets(db, room_id)
         db.delete(room)
         db.commit()
+        publish_notifications(created)
+        publish_unread_counts(discounted)
+        message_cache.evict_room(room_id)
         logger.info(f"Private room {room.id} deleted by user {user.id}")
         return {"message": "Room deleted successfully"}
 
@@ -4,6 +4,8 @@ from app.core.database import get_db
 from app.models.user import User
 from app.models.refresh_token import RefreshToken
 from app.models.notification import Notification  # Added import
+from app.models.coin_ledger import LedgerReason
+from app.services.ledger_services import current_balance, ledger_entry_values, record_entries
 from app.schemas.user import UserCreate, UserResponse, Token, LoginRequest
 from app.core.auth import create_access_token, create_refresh_token, get_current_user
 from fastapi.security import OAuth2PasswordBearer
@@ -62,6 +64,9 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
             notifications=[]  # Initialize empty notifications relationship
         )
         db.add(db_user)
+        db.flush()
+        # The opening grant starts out folded into the snapshot balance above
+        record_entries(db, [ledger_entry_values(db_user.id, 1000, LedgerReason.OPENING_BALANCE, snapshotted=True)])
         db.commit()
         db.refresh(db_user)
         logger.info(f"User created: id={db_user.id}, username={db_user.username}")
@@ -147,7 +152,7 @@ async def get_user_profile(user: User = Depends(get_current_user), db: Session =
             "id": user.id,
             "email": user.email,
             "username": user.username,
-            "coins": user.coins,
+            "coins": current_balance(db, user.id),
             "notifications": [
                 {
                     "id": n.id,
@@ -12,8 +12,38 @@ class Settings(BaseSettings):
     pusher_key: Optional[str] = None
     pusher_secret: Optional[str] = None
     pusher_cluster: Optional[str] = None
+    pusher_host: Optional[str] = None  # Overrides the cluster host, e.g. a local fake Pusher server
+    pusher_port: Optional[int] = None
+    pusher_ssl: bool = Field(default=True)
+    pusher_timeout_seconds: int = Field(default=5)
+    pusher_pool_size: int = Field(default=10)
+    pusher_queue_size: int = Field(default=10000)
+    pusher_workers: int = Field(default=2)
+    pusher_batch_size: int = Field(default=10)
+    pusher_max_retries: int = Field(default=3)
+    pusher_retry_backoff_seconds: float = Field(default=0.2)
+    pusher_overflow_policy: str = Field(default="drop_newest")  # "drop_newest" or "drop_oldest"
     debug: bool = Field(default=True)
     cors_origins: str = Field(default="http://localhost:3000")
+    ws_send_queue_size: int = Field(default=256)
+    ws_send_timeout_seconds: float = Field(default=5.0)
+    message_group_commit: bool = Field(default=False)
+    message_flush_window_ms: float = Field(default=5.0)
+    message_max_batch_size: int = Field(default=500)
+    message_cache_room_size: int = Field(default=200)  # Newest messages kept per room
+    message_cache_max_total: int = Field(default=200000)  # Across all rooms, LRU-evicted by room
+    bet_expiry_batch_window_seconds: float = Field(default=1.0)  # Expirations this close together fire as one batch
+    bet_expiry_sweep_seconds: float = Field(default=60.0)  # Catch-up scan for bets scheduled on a dead worker
+    coin_snapshot_interval_seconds: float = Field(default=300.0)
+    coin_snapshot_min_entries: int = Field(default=50)  # Ledger tail length that earns a user a new snapshot
+    coin_snapshot_batch_size: int = Field(default=500)  # Users folded per transaction
+    pool_cache_max_pools: int = Field(default=1000)  # Odds books kept in memory, LRU-evicted
+    notification_fanout_chunk_size: int = Field(default=1000)  # Recipients per INSERT ... SELECT
+    unread_cache_max_users: int = Field(default=100000)
+    unread_cache_ttl_seconds: float = Field(default=60.0)  # Backstop for workers that miss an invalidation
+    broadcast_backend: str = Field(default="memory")  # "memory" or "postgres"
+    broadcast_database_url: Optional[str] = None  # Session-mode connection for LISTEN; defaults to database_url
+    broadcast_channel: str = Field(default="sodacan_events")
 
     @property
     def parsed_cors_origins(self) -> List[str]:
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Called with (room_id, payload) for every event published by any worker;
+# handlers subscribed to USER_SCOPE get a user id instead of a room id
+Handler = Callable[[int, str], Union[None, Awaitable[None]]]
+
+ROOM_SCOPE = "room"
+USER_SCOPE = "user"
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more
+PG_NOTIFY_MAX_BYTES = 7999
+
+def encode_envelope(key: int, payload: str, scope: str = ROOM_SCOPE) -> str:
+    prefix = "u" if scope == USER_SCOPE else ""
+    return f"{prefix}{key}:{payload}"
+
+def decode_envelope(envelope: str):
+    key, payload = envelope.split(":", 1)
+    if key.startswith("u"):
+        return USER_SCOPE, int(key[1:]), payload
+    return ROOM_SCOPE, int(key), payload
+
+class BroadcastBackend(ABC):
+    """Pub/sub transport that carries already-serialized room events between workers.
+
+    Publishers never deliver locally: every worker, including the one that
+    published, receives the event through its subscription. Events are
+    keyed by room id, or by user id in USER_SCOPE for per-user channels.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, List[Handler]] = {ROOM_SCOPE: [], USER_SCOPE: []}
+        # Called after the backend recovers from an outage that may have lost events
+        self.reconnect_handlers: List[Callable[[], None]] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, handler: Handler, scope: str = ROOM_SCOPE):
+        self.handlers[scope].append(handler)
+
+    def on_reconnect(self, handler: Callable[[], None]):
+        self.reconnect_handlers.append(handler)
+
+    def _reconnected(self):
+        for handler in self.reconnect_handlers:
+            try:
+                handler()
+            except Exception as e:
+                logger.error(f"Broadcast reconnect handler failed: {str(e)}", exc_info=True)
+
+    async def _dispatch(self, key: int, payload: str, scope: str = ROOM_SCOPE):
+        for handler in self.handlers[scope]:
+            try:
+                result = handler(key, payload)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Broadcast handler failed for {scope} {key}: {str(e)}", exc_info=True)
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def publish(self, key: int, payload: str, scope: str = ROOM_SCOPE):
+        ...
+
+    def publish_nowait(self, key: int, payload: str, scope: str = ROOM_SCOPE):
+        """Schedule a publish from synchronous code, on or off the event loop thread."""
+        if self.loop is None:
+            logger.warning(f"Broadcast backend not started, dropping event for {scope} {key}")
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.loop.create_task(self.publish(key, payload, scope))
+        else:
+            asyncio.run_coroutine_threadsafe(self.publish(key, payload, scope), self.loop)
+
+class InMemoryBroadcast(BroadcastBackend):
+    """Single-process backend; events only reach sockets held by this worker."""
+
+    async def publish(self, key: int, payload: str, scope: str = ROOM_SCOPE):
+        await self._dispatch(key, payload, scope)
+
+class PostgresBroadcast(BroadcastBackend):
+    """Cross-worker backend built on Postgres LISTEN/NOTIFY.
+
+    LISTEN needs a session-level connection, so `broadcast_database_url`
+    must point at a direct or session-pooled endpoint, not a transaction
+    pooler such as PgBouncer in transaction mode.
+    """
+
+    def __init__(self, database_url: str, channel: str, reconnect_delay: float = 1.0):
+        super().__init__()
+        self.database_url = make_url(database_url).set(drivername="postgresql")
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.listen_conn = None
+        self._closing = False
+        self.publish_engine = create_engine(database_url, pool_pre_ping=True, pool_size=2, max_overflow=2)
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._closing = False
+        await asyncio.to_thread(self._connect)
+        self.loop.add_reader(self.listen_conn.fileno(), self._on_readable)
+        logger.info(f"Listening for broadcast events on channel {self.channel}")
+
+    def _connect(self):
+        import psycopg2
+        import psycopg2.extensions
+        conn = psycopg2.connect(self.database_url.render_as_string(hide_password=False))
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        self.listen_conn = conn
+
+    def _on_readable(self):
+        try:
+            self.listen_conn.poll()
+        except Exception as e:
+            logger.error(f"Broadcast listener connection lost: {str(e)}")
+            self._drop_listener()
+            if not self._closing:
+                self.loop.create_task(self._reconnect())
+            return
+        while self.listen_conn.notifies:
+            notify = self.listen_conn.notifies.pop(0)
+            try:
+                scope, key, payload = decode_envelope(notify.payload)
+            except ValueError:
+                logger.warning(f"Ignoring malformed broadcast payload: {notify.payload[:100]}")
+                continue
+            self.loop.create_task(self._dispatch(key, payload, scope))
+
+    def _drop_listener(self):
+        if self.listen_conn is None:
+            return
+        try:
+            self.loop.remove_reader(self.listen_conn.fileno())
+        except Exception:
+            pass
+        try:
+            self.listen_conn.close()
+        except Exception:
+            pass
+        self.listen_conn = None
+
+    async def _reconnect(self):
+        while not self._closing:
+            await asyncio.sleep(self.reconnect_delay)
+            try:
+                await self.start()
+                # Notifications sent while the listener was down are gone
+                self._reconnected()
+                return
+            except Exception as e:
+                logger.error(f"Broadcast listener reconnect failed: {str(e)}")
+
+    async def stop(self):
+        self._closing = True
+        self._drop_listener()
+        self.publish_engine.dispose()
+
+    def _notify(self, envelope: str):
+        with self.publish_engine.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": envelope})
+            conn.commit()
+
+    async def publish(self, key: int, payload: str, scope: str = ROOM_SCOPE):
+        envelope = encode_envelope(key, payload, scope)
+        if len(envelope.encode("utf-8")) > PG_NOTIFY_MAX_BYTES:
+            # Too large for NOTIFY; at least reach the sockets held by this worker
+            logger.warning(f"Broadcast payload for {scope} {key} exceeds NOTIFY limit, delivering locally only")
+            await self._dispatch(key, payload, scope)
+            return
+        await asyncio.to_thread(self._notify, envelope)
+
+def create_broadcast_backend() -> BroadcastBackend:
+    if settings.broadcast_backend == "postgres":
+        return PostgresBroadcast(
+            settings.broadcast_database_url or settings.database_url,
+            settings.broadcast_channel
+        )
+    if settings.broadcast_backend != "memory":
+        raise ValueError(f"Unknown broadcast backend: {settings.broadcast_backend}")
+    return InMemoryBroadcast()
+
+broadcast = create_broadcast_backend()
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import logging
+from typing import Dict, Optional, Set
+from fastapi import WebSocket
+from app.config import settings
+
+try:
+    import msgpack
+except ImportError:  # Binary framing is only offered when msgpack is installed
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Close code sent to subscribers that cannot keep up ("Try Again Later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Clients request binary frames with `Sec-WebSocket-Protocol: sodacan.msgpack.v1`
+MSGPACK_SUBPROTOCOL = "sodacan.msgpack.v1"
+
+# Messages are packed as positional arrays in this order instead of maps,
+# so field names are not repeated in every frame
+MESSAGE_FIELDS = ("id", "room_id", "user_id", "seq", "content", "created_at", "username")
+
+def pack_event(event: dict) -> bytes:
+    """Encode an event as MessagePack `[event, data]`."""
+    name, data = event.get("event"), event.get("data")
+    if name == "new-message":
+        data = [data.get(field) for field in MESSAGE_FIELDS]
+    elif name == "replay":
+        data = [[message.get(field) for field in MESSAGE_FIELDS] for message in data]
+    return msgpack.packb([name, data])
+
+class Frame:
+    """One broadcast event, encoded at most once per wire format.
+
+    The same Frame is queued for every subscriber of a room; the JSON text
+    arrives already serialized and the MessagePack form is built lazily the
+    first time a binary subscriber needs it.
+    """
+
+    __slots__ = ("text", "_event", "_binary")
+
+    def __init__(self, text: str, event: dict = None):
+        self.text = text
+        self._event = event
+        self._binary = None
+
+    @classmethod
+    def from_event(cls, event: dict) -> "Frame":
+        return cls(json.dumps(event, default=str), event)
+
+    @property
+    def event(self) -> dict:
+        if self._event is None:
+            self._event = json.loads(self.text)
+        return self._event
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = pack_event(self.event)
+        return self._binary
+
+    @property
+    def seq(self) -> Optional[int]:
+        data = self.event.get("data")
+        return data.get("seq") if isinstance(data, dict) else None
+
+class Subscriber:
+    """A single WebSocket connection with its own bounded outgoing queue.
+
+    Frames are written by a dedicated task so a stalled socket only ever
+    blocks itself, never the broadcaster or the other subscribers.
+    """
+
+    def __init__(self, hub: "RoomHub", room_id: int, websocket: WebSocket, queue_size: int, send_timeout: float, binary: bool = False):
+        self.hub = hub
+        self.room_id = room_id
+        self.websocket = websocket
+        self.send_timeout = send_timeout
+        self.binary = binary
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+        # Highest message seq sent by a resume replay; set once, in start().
+        # Live frames at or below it were in the replay, later ones are new
+        # whatever order they arrive in.
+        self.last_sent_seq: Optional[int] = None
+
+    def start(self, last_sent_seq: Optional[int] = None):
+        """Begin draining the queue; frames queued before this are kept."""
+        self.last_sent_seq = last_sent_seq
+        self.task = asyncio.create_task(self._writer())
+
+    def _already_sent(self, frame: Frame) -> bool:
+        if self.last_sent_seq is None:
+            return False
+        seq = frame.seq
+        return seq is not None and seq <= self.last_sent_seq
+
+    def stop(self):
+        if self.task and not self.task.done() and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    def offer(self, frame: Frame) -> bool:
+        """Queue a frame without waiting; returns False if the queue is full."""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def send(self, frame: Frame):
+        """Write a frame in this subscriber's negotiated format."""
+        if self.binary:
+            await self.websocket.send_bytes(frame.binary)
+        else:
+            await self.websocket.send_text(frame.text)
+
+    async def _writer(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                if self._already_sent(frame):
+                    continue
+                await asyncio.wait_for(self.send(frame), timeout=self.send_timeout)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Dropping subscriber in room {self.room_id}: {str(e)}")
+            self.hub.evict(self)
+
+class RoomHub:
+    """Per-room fan-out of real-time events to every connected WebSocket."""
+
+    def __init__(self, queue_size: int = None, send_timeout: float = None):
+        self.queue_size = queue_size or settings.ws_send_queue_size
+        self.send_timeout = send_timeout or settings.ws_send_timeout_seconds
+        self.rooms: Dict[int, Set[Subscriber]] = {}
+
+    async def connect(self, room_id: int, websocket: WebSocket, paused: bool = False) -> Subscriber:
+        """Accept and subscribe a socket, negotiating MessagePack framing if offered.
+
+        A paused subscriber queues live frames without sending them, so the
+        caller can replay missed history first and then call `start()`.
+        Compression (permessage-deflate) is negotiated by the ASGI server.
+        """
+        binary = msgpack is not None and MSGPACK_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+        await websocket.accept(subprotocol=MSGPACK_SUBPROTOCOL if binary else None)
+        subscriber = Subscriber(self, room_id, websocket, self.queue_size, self.send_timeout, binary=binary)
+        self.rooms.setdefault(room_id, set()).add(subscriber)
+        if not paused:
+            subscriber.start()
+        logger.info(f"New WebSocket connection for room {room_id} ({len(self.rooms[room_id])} subscribers)")
+        return subscriber
+
+    def disconnect(self, subscriber: Subscriber):
+        subscribers = self.rooms.get(subscriber.room_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.rooms[subscriber.room_id]
+        subscriber.stop()
+        logger.info(f"WebSocket connection closed for room {subscriber.room_id}")
+
+    def evict(self, subscriber: Subscriber):
+        """Disconnect a slow or broken subscriber and close its socket in the background."""
+        self.disconnect(subscriber)
+        asyncio.create_task(self._close(subscriber))
+
+    async def _close(self, subscriber: Subscriber):
+        try:
+            await subscriber.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+        except Exception:
+            pass
+
+    def subscriber_count(self, room_id: int) -> int:
+        return len(self.rooms.get(room_id, ()))
+
+    def publish(self, room_id: int, payload: str) -> int:
+        """Queue an already-serialized JSON event for every subscriber of a room."""
+        return self.publish_frame(room_id, Frame(payload))
+
+    def publish_frame(self, room_id: int, frame: Frame) -> int:
+        delivered = 0
+        for subscriber in list(self.rooms.get(room_id, ())):
+            if subscriber.offer(frame):
+                delivered += 1
+            else:
+                logger.warning(f"Evicting slow consumer in room {room_id}")
+                self.evict(subscriber)
+        return delivered
+
+    def broadcast(self, room_id: int, event: dict) -> int:
+        """Serialize an event once and fan it out to the room."""
+        return self.publish_frame(room_id, Frame.from_event(event))
@@ -1,15 +1,181 @@
+import asyncio
+import logging
+from typing import List, Optional
 from pusher import Pusher
+from pusher.errors import PusherBadAuth, PusherBadRequest, PusherForbidden
+from pusher.requests import RequestsBackend
+from requests.adapters import HTTPAdapter
 from fastapi import Depends
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
+# Pusher accepts at most 10 events per trigger_batch call
+PUSHER_MAX_BATCH = 10
+
+# Rejected requests will fail the same way on every attempt
+NON_RETRYABLE_ERRORS = (PusherBadRequest, PusherBadAuth, PusherForbidden)
+
+class PooledRequestsBackend(RequestsBackend):
+    """Pusher HTTP backend whose keep-alive session has a sized connection pool."""
+
+    def __init__(self, client, pool_size: int = 10, **options):
+        super().__init__(client, **options)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self):
+        self.session.close()
+
 class PusherService:
     def __init__(self):
+        self.backends: List[PooledRequestsBackend] = []
         self.client = Pusher(
             app_id=settings.pusher_app_id,
             key=settings.pusher_key,
             secret=settings.pusher_secret,
-            cluster=settings.pusher_cluster
+            cluster=settings.pusher_cluster,
+            ssl=settings.pusher_ssl,
+            host=settings.pusher_host,
+            port=settings.pusher_port,
+            timeout=settings.pusher_timeout_seconds,
+            backend=self._create_backend
         )
 
+    def _create_backend(self, client, **options) -> PooledRequestsBackend:
+        backend = PooledRequestsBackend(client, pool_size=settings.pusher_pool_size, **options)
+        self.backends.append(backend)
+        return backend
+
+    def close(self):
+        for backend in self.backends:
+            backend.close()
+        self.backends = []
+
+# Process-wide client, created on startup so HTTP connections are reused
+_pusher_service: Optional[PusherService] = None
+
+def init_pusher() -> PusherService:
+    global _pusher_service
+    if _pusher_service is None:
+        _pusher_service = PusherService()
+    return _pusher_service
+
+def close_pusher():
+    global _pusher_service
+    if _pusher_service is not None:
+        _pusher_service.close()
+        _pusher_service = None
+
 def get_pusher() -> PusherService:
-    return PusherService()
\ No newline at end of file
+    return init_pusher()
+
+class PusherDispatcher:
+    """Delivers Pusher events from background workers instead of the request path.
+
+    Events are queued without blocking, coalesced into `trigger_batch` calls
+    and retried with exponential backoff. When the queue is full the
+    overflow policy decides whether the new event ("drop_newest") or the
+    oldest queued one ("drop_oldest") is discarded.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = None,
+        workers: int = None,
+        batch_size: int = None,
+        max_retries: int = None,
+        retry_backoff: float = None,
+        overflow_policy: str = None
+    ):
+        self.queue_size = queue_size or settings.pusher_queue_size
+        self.workers = workers or settings.pusher_workers
+        self.batch_size = min(batch_size or settings.pusher_batch_size, PUSHER_MAX_BATCH)
+        self.max_retries = settings.pusher_max_retries if max_retries is None else max_retries
+        self.retry_backoff = settings.pusher_retry_backoff_seconds if retry_backoff is None else retry_backoff
+        self.overflow_policy = overflow_policy or settings.pusher_overflow_policy
+        if self.overflow_policy not in ("drop_newest", "drop_oldest"):
+            raise ValueError(f"Unknown Pusher overflow policy: {self.overflow_policy}")
+        self.service: Optional[PusherService] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+        self.stats = {"enqueued": 0, "sent": 0, "dropped": 0, "failed": 0, "batches": 0}
+
+    async def start(self, service: PusherService = None):
+        self.service = service or init_pusher()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Pusher dispatcher started with {self.workers} workers")
+
+    async def stop(self, timeout: float = 5.0):
+        """Flush what is already queued, then stop the workers."""
+        if self.queue is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Pusher dispatcher stopped with {self.queue.qsize()} events undelivered")
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def enqueue(self, channel: str, event_name: str, data: dict) -> bool:
+        """Queue an event for delivery; returns False if it was dropped."""
+        if self.queue is None:
+            logger.warning(f"Pusher dispatcher not started, dropping {event_name} on {channel}")
+            self.stats["dropped"] += 1
+            return False
+        event = {"channel": channel, "name": event_name, "data": data}
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            if self.overflow_policy == "drop_newest":
+                logger.warning(f"Pusher queue full, dropping {event_name} on {channel}")
+                return False
+            self.queue.get_nowait()
+            self.queue.task_done()
+            logger.warning("Pusher queue full, dropped oldest queued event")
+            self.queue.put_nowait(event)
+        self.stats["enqueued"] += 1
+        return True
+
+    async def _worker(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self._send(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _send(self, batch: List[dict]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if len(batch) == 1:
+                    event = batch[0]
+                    await asyncio.to_thread(self.service.client.trigger, event["channel"], event["name"], event["data"])
+                else:
+                    await asyncio.to_thread(self.service.client.trigger_batch, batch)
+                self.stats["sent"] += len(batch)
+                self.stats["batches"] += 1
+                return
+            except NON_RETRYABLE_ERRORS as e:
+                logger.error(f"Pusher rejected batch of {len(batch)} events: {str(e)}")
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Pusher delivery failed after {attempt + 1} attempts: {str(e)}")
+                    break
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Pusher delivery failed ({str(e)}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        self.stats["failed"] += len(batch)
+
+dispatcher = PusherDispatcher()
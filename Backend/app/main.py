@@ -6,6 +6,11 @@ from app.api.messages import router as message_router
 from app.core.auth import router as auth_router
 from app.api.notifications import router as notification_router
 from app.core.database import init_db
+from app.core.broadcast import broadcast
+from app.core.pusher import dispatcher, init_pusher, close_pusher
+from app.services.message_services import message_buffer, message_cache
+from app.services.bet_services import bet_expiry_scheduler
+from app.services.ledger_services import ledger_snapshotter
 from app.config import settings
 import logging
 
@@ -52,6 +57,13 @@ try:
 except Exception as e:
     logger.error(f"Failed to import bet_router: {str(e)}", exc_info=True)
     raise
+try:
+    logger.debug("Importing pool_router")
+    from app.api.pools import router as pool_router
+    app.include_router(pool_router, prefix="/api/pools", tags=["Pools"])
+except Exception as e:
+    logger.error(f"Failed to import pool_router: {str(e)}", exc_info=True)
+    raise
 try:
     logger.debug("Importing message_router")
     app.include_router(message_router, prefix="/api/messages", tags=["Messages"])
@@ -80,6 +92,32 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Error during DB initialization: {str(e)}", exc_info=True)
         raise e
+    try:
+        await broadcast.start()
+        logger.info(f"Broadcast backend started: {type(broadcast).__name__}")
+    except Exception as e:
+        logger.error(f"Error starting broadcast backend: {str(e)}", exc_info=True)
+        raise e
+    try:
+        await dispatcher.start(init_pusher())
+    except Exception as e:
+        # Chat still works over the WebSocket hub without Pusher credentials
+        logger.error(f"Error starting Pusher dispatcher, Pusher delivery disabled: {str(e)}", exc_info=True)
+    try:
+        await bet_expiry_scheduler.start()
+    except Exception as e:
+        logger.error(f"Error starting bet expiry scheduler: {str(e)}", exc_info=True)
+        raise e
+    await ledger_snapshotter.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ledger_snapshotter.stop()
+    await bet_expiry_scheduler.stop()
+    await message_buffer.close()
+    await dispatcher.stop()
+    close_pusher()
+    await broadcast.stop()
 
 @app.get("/")
 async def root():
@@ -92,4 +130,12 @@ async def health_check():
 @app.get("/debug/routes")
 async def debug_routes():
     routes = [{"path": route.path, "methods": list(route.methods)} for route in app.routes]
-    return {"routes": routes}
\ No newline at end of file
+    return {"routes": routes}
+
+@app.get("/debug/message-cache")
+async def debug_message_cache():
+    return {
+        **message_cache.stats,
+        "rooms": len(message_cache.rooms),
+        "messages": message_cache.total
+    }
\ No newline at end of file
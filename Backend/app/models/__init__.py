@@ -24,6 +24,18 @@ def __getattr__(name):
     elif name == "Notification":
         from .notification import Notification
         return Notification
+    elif name == "CoinLedgerEntry":
+        from .coin_ledger import CoinLedgerEntry
+        return CoinLedgerEntry
+    elif name == "RoomBetStats":
+        from .room_bet_stats import RoomBetStats
+        return RoomBetStats
+    elif name == "BetPool":
+        from .bet_pool import BetPool
+        return BetPool
+    elif name == "NotificationCounter":
+        from .notification_counter import NotificationCounter
+        return NotificationCounter
     raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-__all__ = ["Base", "User", "Room", "RoomMember", "Message", "Bet", "RefreshToken", "Notification"]
\ No newline at end of file
+__all__ = ["Base", "User", "Room", "RoomMember", "Message", "Bet", "RefreshToken", "Notification", "CoinLedgerEntry", "RoomBetStats", "BetPool", "NotificationCounter"]
\ No newline at end of file
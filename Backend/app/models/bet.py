@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime, Index, text
 from sqlalchemy.orm import relationship
 from .base import Base
 from datetime import datetime, timezone
@@ -17,6 +17,24 @@ class BetResult(enum.Enum):
 
 class Bet(Base):
     __tablename__ = "bets"
+    __table_args__ = (
+        # Serves the room bets listing, newest first
+        Index("ix_bets_room_id_created_at_id", "room_id", "created_at", "id"),
+        # Bets still waiting for their expiry notification, by due time
+        Index(
+            "ix_bets_pending_expiry", "end_time",
+            postgresql_where=text("expiry_notified_at IS NULL"),
+            sqlite_where=text("expiry_notified_at IS NULL")
+        ),
+        # Mediator work queue: unresolved bets by reviewer, status and due time
+        Index(
+            "ix_bets_mediator_queue", "mediator_id", "status", "end_time",
+            postgresql_where=text("result = 'UNKNOWN'"),
+            sqlite_where=text("result = 'UNKNOWN'")
+        ),
+        # Stakes of one pool in insertion order, for loading its odds book
+        Index("ix_bets_pool_id_id", "pool_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
@@ -30,6 +48,11 @@ class Bet(Base):
     mediator_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     start_time = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     end_time = Column(DateTime, nullable=False)
+    # Set by the worker that claims the expiry; doubles as the "already notified" flag
+    expiry_notified_at = Column(DateTime, nullable=True)
+    # Set on stakes placed into a BetPool; `outcome` indexes BetPool.outcomes
+    pool_id = Column(Integer, ForeignKey("bet_pools.id", ondelete="CASCADE"), nullable=True)
+    outcome = Column(Integer, nullable=True)
 
     user = relationship("User", foreign_keys=[user_id], back_populates="bets")
     room = relationship("Room", back_populates="bets")
@@ -0,0 +1,19 @@
+# app/models/bet_pool.py
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON
+from .base import Base
+from datetime import datetime, timezone
+
+class BetPool(Base):
+    """A parimutuel market: members back one of `outcomes` with Bet rows carrying pool_id."""
+    __tablename__ = "bet_pools"
+
+    id = Column(Integer, primary_key=True)
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    mediator_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    description = Column(String, nullable=False)
+    outcomes = Column(JSON, nullable=False)  # Outcome labels; stakes refer to them by index
+    winning_outcome = Column(Integer, nullable=True)  # Set once, when the pool is settled
+    end_time = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    settled_at = Column(DateTime, nullable=True)
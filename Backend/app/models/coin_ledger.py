@@ -0,0 +1,34 @@
+# app/models/coin_ledger.py
+from sqlalchemy import Column, Integer, BigInteger, Boolean, ForeignKey, Enum, DateTime, Index, text, false
+from .base import Base
+from datetime import datetime, timezone
+import enum
+
+class LedgerReason(enum.Enum):
+    OPENING_BALANCE = "OPENING_BALANCE"
+    BET_ESCROW = "BET_ESCROW"
+    BET_PAYOUT = "BET_PAYOUT"
+    BET_REFUND = "BET_REFUND"
+
+class CoinLedgerEntry(Base):
+    """One coin movement; rows are only ever inserted (and flagged once snapshotted)."""
+    __tablename__ = "coin_ledger"
+    __table_args__ = (
+        # Per-user history, oldest first
+        Index("ix_coin_ledger_user_id_id", "user_id", "id"),
+        # The tail that still has to be added to the user's snapshot balance
+        Index(
+            "ix_coin_ledger_unsnapshotted", "user_id",
+            postgresql_where=text("NOT snapshotted"),
+            sqlite_where=text("NOT snapshotted")
+        ),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    amount = Column(Integer, nullable=False)  # Signed: credits are positive, debits negative
+    reason = Column(Enum(LedgerReason, name="ledger_reason"), nullable=False)
+    bet_id = Column(Integer, ForeignKey("bets.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    # Already folded into users.coins
+    snapshotted = Column(Boolean, nullable=False, default=False, server_default=false())
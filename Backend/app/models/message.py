@@ -1,21 +1,55 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Index, DDL, event
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .base import Base
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Serves keyset pagination of a room's history on (created_at, id)
+        Index("ix_messages_room_id_created_at_id", "room_id", "created_at", "id"),
+        # Serves delta sync (seq > N) and guarantees per-room uniqueness
+        Index("ux_messages_room_id_seq", "room_id", "seq", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     room_id = Column(Integer, ForeignKey("rooms.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
     content = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    seq = Column(BigInteger, nullable=False)  # Per-room, allocated from Room.last_message_seq
     
     # Relationships to the Room and User tables
     user = relationship("User", back_populates="messages")
     room = relationship("Room", back_populates="messages")
 
     def __repr__(self):
-        return f"<Message(id={self.id}, room_id={self.room_id}, user_id={self.user_id}, content={self.content}, created_at={self.created_at})>"
+        return f"<Message(id={self.id}, room_id={self.room_id}, user_id={self.user_id}, seq={self.seq}, content={self.content}, created_at={self.created_at})>"
 
+
+
+# Text search configuration shared by the search_vector column and queries
+SEARCH_CONFIG = "english"
+
+# Full-text search lives outside the ORM mapping: a generated tsvector column
+# with a GIN index on Postgres, and an external-content FTS5 table kept in
+# sync by triggers on SQLite (local and test runs).
+event.listen(Message.__table__, "after_create", DDL(
+    f"ALTER TABLE messages ADD COLUMN search_vector tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', coalesce(content, ''))) STORED"
+).execute_if(dialect="postgresql"))
+event.listen(Message.__table__, "after_create", DDL(
+    "CREATE INDEX ix_messages_search_vector ON messages USING GIN (search_vector)"
+).execute_if(dialect="postgresql"))
+
+for statement in (
+    "CREATE VIRTUAL TABLE messages_fts USING fts5(content, content='messages', content_rowid='id')",
+    "CREATE TRIGGER messages_fts_ai AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER messages_fts_ad AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER messages_fts_au AFTER UPDATE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+):
+    event.listen(Message.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
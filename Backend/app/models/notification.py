@@ -1,12 +1,16 @@
 # app/models/notification.py
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 from datetime import datetime, timezone
 
 class Notification(Base):
     __tablename__ = "notifications"
-    
+    __table_args__ = (
+        # Serves the notifications feed, newest first
+        Index("ix_notifications_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     bet_id = Column(Integer, ForeignKey("bets.id", ondelete="CASCADE"), nullable=True)
@@ -0,0 +1,10 @@
+# app/models/notification_counter.py
+from sqlalchemy import Column, Integer, ForeignKey
+from .base import Base
+
+class NotificationCounter(Base):
+    """Unresolved notification count per user, bumped alongside every insert and resolve."""
+    __tablename__ = "notification_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread = Column(Integer, nullable=False, default=0, server_default="0")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Enum, DateTime, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, ForeignKey, Enum, DateTime, Text
 from sqlalchemy.orm import relationship
 from .base import Base
 from datetime import datetime, timezone
@@ -20,6 +20,7 @@ class Room(Base):
     token = Column(String(50), nullable=True, unique=True)  # Added length and unique constraint
     created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime, nullable=True, onupdate=lambda: datetime.now(timezone.utc))  # Added updated_at
+    last_message_seq = Column(BigInteger, nullable=False, default=0, server_default="0")  # Last Message.seq handed out
 
     # Relationships
     creator = relationship("User", back_populates="rooms")
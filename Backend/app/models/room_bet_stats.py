@@ -0,0 +1,20 @@
+# app/models/room_bet_stats.py
+from sqlalchemy import Column, Integer, BigInteger, ForeignKey, DateTime
+from .base import Base
+from datetime import datetime, timezone
+
+class RoomBetStats(Base):
+    """Running bet totals for one room, bumped in the same transaction as each bet change."""
+    __tablename__ = "room_bet_stats"
+
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), primary_key=True)
+    bet_count = Column(Integer, nullable=False, default=0, server_default="0")
+    pending_count = Column(Integer, nullable=False, default=0, server_default="0")
+    approved_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rejected_count = Column(Integer, nullable=False, default=0, server_default="0")
+    open_count = Column(Integer, nullable=False, default=0, server_default="0")  # Neither settled nor rejected
+    settled_count = Column(Integer, nullable=False, default=0, server_default="0")
+    open_pot = Column(BigInteger, nullable=False, default=0, server_default="0")  # Stakes riding on open bets
+    total_staked = Column(BigInteger, nullable=False, default=0, server_default="0")  # Excludes rejected (refunded) bets
+    total_paid = Column(BigInteger, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Enum
+from sqlalchemy import Column, Integer, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 from .base import Base
 import enum
@@ -10,7 +10,11 @@ class Role(enum.Enum):
 
 class RoomMember(Base):
     __tablename__ = "room_members"
-    
+    __table_args__ = (
+        # Membership checks and room-wide fan-out in user_id order
+        Index("ix_room_members_room_id_user_id", "room_id", "user_id"),
+    )
+
     id = Column(Integer, primary_key=True)
     room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -9,6 +9,7 @@ class User(Base):
     email = Column(String, unique=True, nullable=False)
     username = Column(String, unique=True, nullable=False)
     password_hash = Column(String, nullable=False)
+    # Balance as of the last ledger snapshot; see ledger_services.current_balance
     coins = Column(Integer, nullable=False, default=1000)
     
     # Relationships
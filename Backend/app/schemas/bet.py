@@ -1,5 +1,5 @@
 from pydantic import BaseModel, StringConstraints
-from typing import Annotated, Optional
+from typing import Annotated, Dict, Literal, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -38,4 +38,30 @@ class BetResponse(BaseModel):
     start_time: datetime
     end_time: datetime
 
-    model_config = {"from_attributes": True}
\ No newline at end of file
+    model_config = {"from_attributes": True}
+
+class BetSettlementRequest(BaseModel):
+    room_id: int
+    results: Dict[int, BetResult]  # bet id -> WON / LOST / DRAW
+    mode: Literal["fixed", "parimutuel"] = "fixed"
+
+class BetSettlementResponse(BaseModel):
+    room_id: int
+    settled: int
+    skipped: int  # Already settled, not approved, a pool stake, or mediated by someone else
+    total_staked: int
+    total_paid: int
+
+class RoomBetStatsResponse(BaseModel):
+    room_id: int
+    bet_count: int = 0
+    pending_count: int = 0
+    approved_count: int = 0
+    rejected_count: int = 0
+    open_count: int = 0
+    settled_count: int = 0
+    open_pot: int = 0
+    total_staked: int = 0
+    total_paid: int = 0
+
+    model_config = {"from_attributes": True}
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class MessageCreate(BaseModel):
@@ -13,10 +13,19 @@ class MessageResponse(BaseModel):
     content: str
     created_at: datetime
     username: Optional[str] = None  # Include username for frontend
+    seq: Optional[int] = None  # Per-room sequence number for delta sync
 
     class Config:
         from_attributes = True
 
 class TestMessageCreate(BaseModel):
     room_id: int
-    message: str
\ No newline at end of file
+    message: str
+
+class MessageSearchResult(MessageResponse):
+    rank: float
+    highlight: str  # HTML-escaped content with matched terms wrapped in <mark></mark>
+
+class MessageSearchPage(BaseModel):
+    results: List[MessageSearchResult]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` for the next page
@@ -0,0 +1,31 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
+from datetime import datetime
+
+class NotificationResponse(BaseModel):
+    id: int
+    user_id: int
+    bet_id: Optional[int] = None
+    type: str
+    message: str
+    created_at: datetime
+    resolved: bool
+    bet_description: Optional[str] = None
+
+    model_config = {"from_attributes": True}
+
+class NotificationResolveRequest(BaseModel):
+    """Exactly one of: explicit `ids`, everything older than the `before` cursor, or `all`."""
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=1000)
+    before: Optional[int] = None  # Same exclusive cursor as the feed's `before`
+    all: bool = False
+
+    @model_validator(mode="after")
+    def check_one_target(self):
+        if sum((self.ids is not None, self.before is not None, self.all)) != 1:
+            raise ValueError("Provide exactly one of ids, before or all")
+        return self
+
+class NotificationResolveResponse(BaseModel):
+    resolved: int  # Rows flipped by this call
+    unresolved: int  # Still unresolved afterwards
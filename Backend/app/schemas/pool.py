@@ -0,0 +1,39 @@
+from pydantic import BaseModel, Field, StringConstraints
+from typing import Annotated, List, Optional
+from datetime import datetime
+
+OutcomeLabel = Annotated[str, StringConstraints(min_length=1, max_length=100, strip_whitespace=True)]
+
+class PoolCreate(BaseModel):
+    room_id: int
+    description: Annotated[str, StringConstraints(min_length=3, strip_whitespace=True)]
+    outcomes: List[OutcomeLabel] = Field(..., min_length=2, max_length=16)
+    mediator_id: int
+    end_time: datetime
+
+class StakeCreate(BaseModel):
+    outcome: int = Field(..., ge=0)
+    amount: int = Field(..., gt=0)
+
+class PoolOutcome(BaseModel):
+    index: int
+    label: str
+    total: int
+    odds: Optional[float] = None  # Decimal odds (pot / backing); None while unbacked
+    your_stake: int = 0
+    your_payout: int = 0  # Projected, if this outcome wins at the current odds
+
+class PoolResponse(BaseModel):
+    id: int
+    room_id: int
+    description: str
+    mediator_id: int
+    end_time: datetime
+    created_at: datetime
+    winning_outcome: Optional[int] = None
+    pot: int
+    stake_count: int
+    outcomes: List[PoolOutcome]
+
+class PoolSettleRequest(BaseModel):
+    winning_outcome: int = Field(..., ge=0)
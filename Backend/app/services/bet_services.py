@@ -0,0 +1,368 @@
+import asyncio
+import heapq
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.core.database import SessionLocal
+from app.models.bet import Bet, BetStatus, BetResult
+from app.models.coin_ledger import LedgerReason
+from app.models.notification import Notification
+from app.models.room_bet_stats import RoomBetStats
+from app.services.ledger_services import debit, ledger_entry_values, record_entries
+from app.services.notification_services import bet_result_notification_values, bump_unread_counts, publish_notifications
+
+try:
+    import numpy as np
+except ImportError:  # Payout math falls back to plain Python
+    np = None
+
+logger = logging.getLogger(__name__)
+
+def utc_naive(value: datetime) -> datetime:
+    """Bet times are stored as naive UTC; normalize aware datetimes to match."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def escrow_coins(db: Session, user_id: int, amount: int, bet_id: Optional[int] = None) -> Optional[int]:
+    """Debit a bet's stake if the balance covers it; returns the new balance, or None.
+
+    The debit is a BET_ESCROW ledger entry, so concurrent placements by the
+    same user serialize on that user's row only. The caller commits it
+    together with the Bet insert.
+    """
+    return debit(db, user_id, amount, LedgerReason.BET_ESCROW, bet_id)
+
+def bump_room_bet_stats(db: Session, room_id: int, **deltas: int):
+    """Add `deltas` to a room's RoomBetStats row, creating it on first use.
+
+    One upsert, so it locks only that room's stats row until the caller
+    commits alongside the bet change it accounts for.
+    """
+    table = RoomBetStats.__table__
+    dialect_insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    stmt = dialect_insert(table).values(room_id=room_id, updated_at=datetime.now(timezone.utc), **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.room_id],
+        set_={
+            **{name: table.c[name] + stmt.excluded[name] for name in deltas},
+            "updated_at": stmt.excluded.updated_at
+        }
+    )
+    db.execute(stmt)
+
+def review_bet(db: Session, bet_id: int, mediator_id: int, approve: bool):
+    """Approve or reject a pending bet; returns its (room_id, user_id, amount), or None.
+
+    Only the bet's mediator can review it, and only while it is PENDING and
+    unsettled. A rejection refunds the stake. The caller commits.
+    """
+    row = db.execute(
+        update(Bet)
+        .where(
+            Bet.id == bet_id,
+            Bet.mediator_id == mediator_id,
+            Bet.status == BetStatus.PENDING,
+            Bet.result == BetResult.UNKNOWN
+        )
+        .values(
+            status=BetStatus.APPROVED if approve else BetStatus.REJECTED,
+            approved_by=mediator_id if approve else None
+        )
+        .returning(Bet.room_id, Bet.user_id, Bet.amount)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        return None
+    if approve:
+        bump_room_bet_stats(db, row.room_id, pending_count=-1, approved_count=1)
+    else:
+        record_entries(db, [ledger_entry_values(row.user_id, row.amount, LedgerReason.BET_REFUND, bet_id)])
+        bump_room_bet_stats(
+            db, row.room_id,
+            pending_count=-1, rejected_count=1, open_count=-1,
+            open_pot=-row.amount, total_staked=-row.amount
+        )
+    return row
+
+class BetExpiryScheduler:
+    """Fires mediator notifications when bets reach their end_time.
+
+    Pending expirations live in a min-heap keyed on end_time, loaded from
+    `bets` on startup and fed by `create_bet`, so each bet costs O(log n)
+    to schedule. Once the earliest bet is due, everything ending within
+    the next `batch_window` is claimed with it in one conditional UPDATE on `expiry_notified_at`; only rows this
+    worker flips from NULL get a notification, so several workers can run
+    the scheduler without double-notifying. A slow sweep over the partial
+    pending-expiry index picks up bets scheduled on a worker that died.
+    """
+
+    def __init__(self, batch_window: float = None, sweep_interval: float = None):
+        self.batch_window = timedelta(seconds=settings.bet_expiry_batch_window_seconds if batch_window is None else batch_window)
+        self.sweep_interval = settings.bet_expiry_sweep_seconds if sweep_interval is None else sweep_interval
+        self.heap: List[Tuple[datetime, int]] = []
+        self.scheduled: Set[int] = set()
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.wakeup = asyncio.Event()
+        pending = await asyncio.to_thread(self._load_pending)
+        for bet_id, end_time in pending:
+            self._push(bet_id, end_time)
+        self.task = asyncio.create_task(self._run())
+        logger.info(f"Bet expiry scheduler started with {len(pending)} pending bets")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def schedule(self, bet_id: int, end_time: datetime):
+        """Track a new bet; wakes the loop if it is now the earliest."""
+        if self.wakeup is None:
+            return  # Not started; the sweep or the next startup load will find it
+        if self._push(bet_id, utc_naive(end_time)):
+            self.wakeup.set()
+
+    def _push(self, bet_id: int, end_time: datetime) -> bool:
+        if bet_id in self.scheduled:
+            return False
+        self.scheduled.add(bet_id)
+        heapq.heappush(self.heap, (end_time, bet_id))
+        return self.heap[0][1] == bet_id
+
+    def _pop_due(self, due_by: datetime) -> List[int]:
+        due = []
+        while self.heap and self.heap[0][0] <= due_by:
+            _, bet_id = heapq.heappop(self.heap)
+            self.scheduled.discard(bet_id)
+            due.append(bet_id)
+        return due
+
+    async def _run(self):
+        next_sweep = utcnow() + timedelta(seconds=self.sweep_interval)
+        while True:
+            try:
+                now = utcnow()
+                if self.heap and self.heap[0][0] <= now:
+                    due_by = now + self.batch_window
+                    await asyncio.to_thread(self._fire, self._pop_due(due_by), due_by)
+                    continue
+                if now >= next_sweep:
+                    for bet_id, end_time in await asyncio.to_thread(self._load_pending, now):
+                        self._push(bet_id, end_time)
+                    next_sweep = now + timedelta(seconds=self.sweep_interval)
+                    continue
+                timeout = (next_sweep - now).total_seconds()
+                if self.heap:
+                    timeout = min(timeout, (self.heap[0][0] - now).total_seconds())
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=max(timeout, 0))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Bet expiry scheduler iteration failed: {str(e)}", exc_info=True)
+                await asyncio.sleep(1)
+
+    def _load_pending(self, due_by: datetime = None) -> List[Tuple[int, datetime]]:
+        db = SessionLocal()
+        try:
+            query = db.query(Bet.id, Bet.end_time).filter(Bet.expiry_notified_at.is_(None))
+            if due_by is not None:
+                query = query.filter(Bet.end_time <= due_by)
+            return [(row.id, row.end_time) for row in query.all()]
+        finally:
+            db.close()
+
+    def _fire(self, bet_ids: List[int], due_by: datetime):
+        """Claim and notify a batch of expired bets in one transaction."""
+        now = utcnow()
+        db = SessionLocal()
+        try:
+            claimed = db.execute(
+                update(Bet)
+                .where(
+                    Bet.id.in_(bet_ids),
+                    Bet.expiry_notified_at.is_(None),
+                    Bet.end_time <= due_by
+                )
+                .values(expiry_notified_at=now)
+                .returning(Bet.id, Bet.mediator_id, Bet.description, Bet.status, Bet.result)
+                .execution_options(synchronize_session=False)
+            ).all()
+            notify = [
+                row for row in claimed
+                if row.status != BetStatus.REJECTED and row.result == BetResult.UNKNOWN
+            ]
+            created = []
+            if notify:
+                created = db.execute(
+                    insert(Notification).returning(*Notification.__table__.columns, sort_by_parameter_order=True),
+                    [bet_result_notification_values(row.id, row.mediator_id, row.description, now) for row in notify]
+                ).mappings().all()
+                bump_unread_counts(db, Counter(row["user_id"] for row in created))
+            db.commit()
+            publish_notifications(created)
+            logger.info(f"Expired {len(bet_ids)} bets, claimed {len(claimed)}, notified {len(notify)} mediators")
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+bet_expiry_scheduler = BetExpiryScheduler()
+
+
+PAYOUT_MODES = ("fixed", "parimutuel")
+
+def compute_payouts(amounts: List[int], results: List[BetResult], mode: str = "fixed") -> List[int]:
+    """Coins credited back per bet; stakes were already taken at placement.
+
+    "fixed" pays even money: winners get twice their stake, draws are
+    refunded, losers get nothing. "parimutuel" treats the settled bets as
+    one pool: winners split the losing stakes in proportion to their own
+    stake (rounded down), draws are refunded, and if nobody won every stake
+    is refunded.
+    """
+    if mode not in PAYOUT_MODES:
+        raise ValueError(f"Unknown payout mode: {mode}")
+    if np is not None:
+        stake = np.asarray(amounts, dtype=np.int64)
+        won = np.fromiter((r == BetResult.WON for r in results), dtype=bool, count=len(results))
+        draw = np.fromiter((r == BetResult.DRAW for r in results), dtype=bool, count=len(results))
+        if mode == "fixed":
+            payout = np.where(won, stake * 2, np.where(draw, stake, 0))
+        else:
+            winning_total = int(stake[won].sum())
+            if winning_total == 0:
+                return stake.tolist()
+            losing_total = int(stake[~won & ~draw].sum())
+            payout = np.where(won, stake + (stake * losing_total) // winning_total, np.where(draw, stake, 0))
+        return payout.tolist()
+
+    if mode == "fixed":
+        return [a * 2 if r == BetResult.WON else a if r == BetResult.DRAW else 0 for a, r in zip(amounts, results)]
+    winning_total = sum(a for a, r in zip(amounts, results) if r == BetResult.WON)
+    if winning_total == 0:
+        return list(amounts)
+    losing_total = sum(a for a, r in zip(amounts, results) if r == BetResult.LOST)
+    return [
+        a + (a * losing_total) // winning_total if r == BetResult.WON else a if r == BetResult.DRAW else 0
+        for a, r in zip(amounts, results)
+    ]
+
+PAYOUT_REASONS = {
+    BetResult.WON: LedgerReason.BET_PAYOUT,
+    BetResult.LOST: LedgerReason.BET_PAYOUT,
+    BetResult.DRAW: LedgerReason.BET_REFUND
+}
+
+def settle_bets(
+    db: Session,
+    room_id: int,
+    results: Dict[int, BetResult],
+    mediator_id: Optional[int] = None,
+    mode: str = "fixed",
+    pool_id: Optional[int] = None
+) -> dict:
+    """Resolve many bets in a room and pay them out in one transaction.
+
+    Each result gets one UPDATE over its bets, limited to approved bets that
+    are still UNKNOWN (and, if given, mediated by `mediator_id`), so pending
+    bets are never paid and settling twice never pays twice. Pool stakes
+    are only settled when `pool_id` names their pool; otherwise only bets
+    outside any pool are touched. Payouts are then credited as one ledger
+    INSERT. The caller commits.
+    """
+    if mode not in PAYOUT_MODES:
+        raise ValueError(f"Unknown payout mode: {mode}")
+    by_result: Dict[BetResult, List[int]] = defaultdict(list)
+    for bet_id, result in results.items():
+        if result == BetResult.UNKNOWN:
+            raise ValueError("A bet cannot be settled as UNKNOWN")
+        by_result[result].append(bet_id)
+
+    settled = []
+    for result, bet_ids in by_result.items():
+        conditions = [
+            Bet.id.in_(bet_ids),
+            Bet.room_id == room_id,
+            Bet.result == BetResult.UNKNOWN,
+            Bet.status == BetStatus.APPROVED,
+            Bet.pool_id.is_(None) if pool_id is None else Bet.pool_id == pool_id
+        ]
+        if mediator_id is not None:
+            conditions.append(Bet.mediator_id == mediator_id)
+        rows = db.execute(
+            update(Bet)
+            .where(*conditions)
+            .values(result=result)
+            .returning(Bet.id, Bet.user_id, Bet.amount)
+            .execution_options(synchronize_session=False)
+        ).all()
+        settled.extend((row.id, row.user_id, row.amount, result) for row in rows)
+
+    payouts = compute_payouts([amount for _, _, amount, _ in settled], [result for _, _, _, result in settled], mode)
+    record_entries(db, [
+        ledger_entry_values(user_id, payout, PAYOUT_REASONS[result], bet_id)
+        for (bet_id, user_id, _, result), payout in zip(settled, payouts)
+    ])
+    if settled:
+        staked = sum(amount for _, _, amount, _ in settled)
+        bump_room_bet_stats(
+            db, room_id,
+            open_count=-len(settled), settled_count=len(settled),
+            open_pot=-staked, total_paid=sum(payouts)
+        )
+
+    summary = {
+        "room_id": room_id,
+        "settled": len(settled),
+        "skipped": len(results) - len(settled),
+        "total_staked": sum(amount for _, _, amount, _ in settled),
+        "total_paid": sum(payouts)
+    }
+    logger.info(f"Settled {summary['settled']} bets in room {room_id} ({mode}), paid {summary['total_paid']} coins")
+    return summary
+
+def refund_room_bets(db: Session, room_id: int) -> int:
+    """Give back the stakes of a room's open bets, pool stakes included; returns the coins refunded.
+
+    Call before deleting the room, whose cascade would otherwise take the
+    escrowed stakes with it. Bets are claimed as DRAW with the same
+    conditional UPDATE settlement uses, so a concurrent settlement cannot
+    pay them as well. The caller commits.
+    """
+    rows = db.execute(
+        update(Bet)
+        .where(
+            Bet.room_id == room_id,
+            Bet.result == BetResult.UNKNOWN,
+            Bet.status != BetStatus.REJECTED
+        )
+        .values(result=BetResult.DRAW)
+        .returning(Bet.id, Bet.user_id, Bet.amount)
+        .execution_options(synchronize_session=False)
+    ).all()
+    record_entries(db, [
+        ledger_entry_values(row.user_id, row.amount, LedgerReason.BET_REFUND, row.id)
+        for row in rows
+    ])
+    refunded = sum(row.amount for row in rows)
+    if rows:
+        logger.info(f"Refunded {len(rows)} open bets ({refunded} coins) in room {room_id}")
+    return refunded
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import Integer, bindparam, column, func, insert, select, update, values
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.core.database import SessionLocal
+from app.models.coin_ledger import CoinLedgerEntry, LedgerReason
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+def ledger_entry_values(user_id: int, amount: int, reason: LedgerReason, bet_id: Optional[int] = None, snapshotted: bool = False) -> dict:
+    return {
+        "user_id": user_id,
+        "amount": amount,
+        "reason": reason,
+        "bet_id": bet_id,
+        "created_at": datetime.now(timezone.utc),
+        "snapshotted": snapshotted
+    }
+
+def record_entries(db: Session, entries: Iterable[dict]):
+    """Append many ledger entries in one INSERT; credits need no lock."""
+    entries = [entry for entry in entries if entry["amount"]]
+    if entries:
+        db.execute(insert(CoinLedgerEntry), entries)
+
+def _tail_sum(user_id):
+    return (
+        select(func.coalesce(func.sum(CoinLedgerEntry.amount), 0))
+        .where(CoinLedgerEntry.user_id == user_id, CoinLedgerEntry.snapshotted.is_(False))
+        .scalar_subquery()
+    )
+
+def current_balance(db: Session, user_id: int) -> Optional[int]:
+    """Snapshot balance plus the ledger entries recorded since, in one statement."""
+    return db.execute(
+        select(User.coins + _tail_sum(User.id)).where(User.id == user_id)
+    ).scalar_one_or_none()
+
+def debit(db: Session, user_id: int, amount: int, reason: LedgerReason, bet_id: Optional[int] = None) -> Optional[int]:
+    """Append a debit if the balance covers it; returns the new balance, or None.
+
+    Debits for one user serialize on that user's row so two of them cannot
+    both pass the balance check. Credits and snapshots never wait on this:
+    a credit landing mid-check only means the balance was read low. The
+    caller commits.
+    """
+    if db.bind.dialect.name == "sqlite":
+        # No FOR UPDATE here; a no-op write takes the database write lock instead
+        lock = update(User).where(User.id == user_id).values(coins=User.coins).returning(User.id)
+    else:
+        lock = select(User.id).where(User.id == user_id).with_for_update()
+    if db.execute(lock.execution_options(synchronize_session=False)).scalar_one_or_none() is None:
+        return None
+    balance = current_balance(db, user_id)
+    if balance < amount:
+        return None
+    record_entries(db, [ledger_entry_values(user_id, -amount, reason, bet_id)])
+    return balance - amount
+
+def snapshot_balances(db: Session, user_ids: List[int]) -> int:
+    """Fold the unsnapshotted tail of each user into users.coins.
+
+    Only entries committed before the flagging UPDATE are folded; anything
+    still in flight stays in the tail for the next snapshot. Returns the
+    number of entries folded. The caller commits.
+    """
+    if not user_ids:
+        return 0
+    folded = db.execute(
+        update(CoinLedgerEntry)
+        .where(CoinLedgerEntry.user_id.in_(user_ids), CoinLedgerEntry.snapshotted.is_(False))
+        .values(snapshotted=True)
+        .returning(CoinLedgerEntry.user_id, CoinLedgerEntry.amount)
+        .execution_options(synchronize_session=False)
+    ).all()
+    deltas: Dict[int, int] = defaultdict(int)
+    for row in folded:
+        deltas[row.user_id] += row.amount
+    # Fixed lock order so overlapping snapshots cannot deadlock
+    rows = sorted((user_id, delta) for user_id, delta in deltas.items() if delta)
+    if rows and db.bind.dialect.name == "postgresql":
+        delta = values(column("user_id", Integer), column("amount", Integer), name="delta").data(rows)
+        db.execute(
+            update(User)
+            .where(User.id == delta.c.user_id)
+            .values(coins=User.coins + delta.c.amount)
+            .execution_options(synchronize_session=False)
+        )
+    elif rows:
+        db.execute(
+            update(User.__table__)
+            .where(User.__table__.c.id == bindparam("delta_user_id"))
+            .values(coins=User.__table__.c.coins + bindparam("delta_amount")),
+            [{"delta_user_id": user_id, "delta_amount": amount} for user_id, amount in rows]
+        )
+    return len(folded)
+
+class LedgerSnapshotter:
+    """Periodically folds long ledger tails into the users' snapshot balances.
+
+    Keeps `current_balance` a short index range scan over the partial
+    unsnapshotted index no matter how many bets a user has placed.
+    """
+
+    def __init__(self, interval: float = None, min_entries: int = None, batch_size: int = None):
+        self.interval = settings.coin_snapshot_interval_seconds if interval is None else interval
+        self.min_entries = settings.coin_snapshot_min_entries if min_entries is None else min_entries
+        self.batch_size = settings.coin_snapshot_batch_size if batch_size is None else batch_size
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.task = asyncio.create_task(self._run())
+        logger.info(f"Ledger snapshotter started, every {self.interval}s")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.snapshot_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ledger snapshot failed: {str(e)}", exc_info=True)
+
+    def snapshot_once(self) -> int:
+        db = SessionLocal()
+        try:
+            user_ids = db.execute(
+                select(CoinLedgerEntry.user_id)
+                .where(CoinLedgerEntry.snapshotted.is_(False))
+                .group_by(CoinLedgerEntry.user_id)
+                .having(func.count() >= self.min_entries)
+                .order_by(CoinLedgerEntry.user_id)
+            ).scalars().all()
+            folded = 0
+            for start in range(0, len(user_ids), self.batch_size):
+                folded += snapshot_balances(db, user_ids[start:start + self.batch_size])
+                db.commit()
+            if user_ids:
+                logger.info(f"Snapshotted {len(user_ids)} balances, folded {folded} ledger entries")
+            return folded
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+ledger_snapshotter = LedgerSnapshotter()
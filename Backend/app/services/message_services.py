@@ -0,0 +1,417 @@
+import asyncio
+import base64
+import bisect
+import html
+import json
+import logging
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import insert, text, update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.core.database import SessionLocal
+from app.models.message import Message, SEARCH_CONFIG
+from app.models.room import Room
+from app.schemas.message import MessageResponse, MessageSearchResult, MessageSearchPage
+
+logger = logging.getLogger(__name__)
+
+def allocate_message_seqs(db: Session, room_id: int, count: int = 1) -> int:
+    """Reserve `count` consecutive sequence numbers in a room; returns the first.
+
+    The counter row stays locked until the caller's transaction ends, so
+    sequence numbers are handed out in commit order within a room.
+    """
+    last_seq = db.execute(
+        update(Room)
+        .where(Room.id == room_id)
+        .values(last_message_seq=Room.last_message_seq + count, updated_at=Room.updated_at)
+        .returning(Room.last_message_seq)
+    ).scalar_one()
+    return last_seq - count + 1
+
+def messages_since(db: Session, room_id: int, since_seq: int, limit: int):
+    """(Message, username) rows with seq > since_seq, in seq order."""
+    from app.models.user import User
+    return db.query(Message, User.username).outerjoin(
+        User, User.id == Message.user_id
+    ).filter(
+        Message.room_id == room_id,
+        Message.seq > since_seq
+    ).order_by(Message.seq.asc()).limit(limit).all()
+
+def message_event(message, username: Optional[str]) -> dict:
+    """The real-time payload for a message, shared by live fan-out and replay."""
+    return {
+        "id": message.id,
+        "room_id": message.room_id,
+        "user_id": message.user_id,
+        "seq": message.seq,
+        "content": message.content,
+        "created_at": message.created_at.isoformat(),
+        "username": username
+    }
+
+class MessageWriteBuffer:
+    """Group-commit writer for chat messages.
+
+    Messages submitted within one flush window are written with a single
+    multi-row INSERT and a single COMMIT. Each caller awaits its own row's
+    id, created_at and seq. A batch is flushed early once it reaches
+    `max_batch_size`.
+    """
+
+    def __init__(self, flush_window_ms: float = None, max_batch_size: int = None):
+        self.flush_window = (flush_window_ms if flush_window_ms is not None else settings.message_flush_window_ms) / 1000
+        self.max_batch_size = max_batch_size or settings.message_max_batch_size
+        self.pending: List[Tuple[dict, asyncio.Future]] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.inflight: set = set()
+
+    async def submit(self, room_id: int, user_id: Optional[int], content: str, created_at: datetime) -> Tuple[int, datetime, int]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append(({
+            "room_id": room_id,
+            "user_id": user_id,
+            "content": content,
+            "created_at": created_at
+        }, future))
+        if len(self.pending) >= self.max_batch_size:
+            self._flush_now()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.flush_window, self._flush_now)
+        return await future
+
+    def _flush_now(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        task = asyncio.get_running_loop().create_task(self._flush(batch))
+        self.inflight.add(task)
+        task.add_done_callback(self.inflight.discard)
+
+    async def _flush(self, batch: List[Tuple[dict, asyncio.Future]]):
+        try:
+            rows = await asyncio.to_thread(self._write, [values for values, _ in batch])
+        except Exception as e:
+            logger.error(f"Group commit of {len(batch)} messages failed: {str(e)}", exc_info=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), row in zip(batch, rows):
+            if not future.done():
+                future.set_result((row.id, row.created_at, row.seq))
+        logger.debug(f"Group-committed {len(batch)} messages")
+
+    def _write(self, values: List[dict]):
+        db = SessionLocal()
+        try:
+            by_room: Dict[int, List[dict]] = {}
+            for row in values:
+                by_room.setdefault(row["room_id"], []).append(row)
+            # Lock room counters in a fixed order so concurrent flushes cannot deadlock
+            for room_id in sorted(by_room):
+                first_seq = allocate_message_seqs(db, room_id, len(by_room[room_id]))
+                for offset, row in enumerate(by_room[room_id]):
+                    row["seq"] = first_seq + offset
+            result = db.execute(
+                insert(Message).returning(Message.id, Message.created_at, Message.seq, sort_by_parameter_order=True),
+                values
+            )
+            rows = result.all()
+            db.commit()
+            return rows
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def close(self):
+        """Flush anything still buffered and wait for in-flight batches."""
+        self._flush_now()
+        if self.inflight:
+            await asyncio.gather(*self.inflight, return_exceptions=True)
+
+message_buffer = MessageWriteBuffer()
+
+
+class RoomTail:
+    """The newest messages of one room, ordered by (created_at, id)."""
+
+    def __init__(self, messages: List[MessageResponse], capacity: int, complete: bool):
+        self.capacity = capacity
+        self.messages = list(messages[-capacity:])
+        self.keys = [(m.created_at, m.id) for m in self.messages]
+        self.ids = {m.id for m in self.messages}
+        # True while the tail still holds the room's entire history
+        self.complete = complete and len(messages) <= capacity
+        self.last_seq = max((m.seq or 0 for m in messages), default=0)
+
+    def append(self, message: MessageResponse) -> Optional[int]:
+        """Insert a message in key order; returns how many messages were trimmed.
+
+        Returns None, without changing the tail, when the message's seq is
+        not the next one after the newest cached seq: an event was missed
+        and the tail can no longer be trusted.
+        """
+        if message.id in self.ids:
+            return 0
+        if message.seq is not None and message.seq <= self.last_seq:
+            return 0  # Older than the cached window
+        if message.seq != self.last_seq + 1:
+            return None
+        self.last_seq = message.seq
+        key = (message.created_at, message.id)
+        if self.keys and key < self.keys[-1]:
+            index = bisect.bisect(self.keys, key)
+        else:
+            index = len(self.keys)
+        self.keys.insert(index, key)
+        self.messages.insert(index, message)
+        self.ids.add(message.id)
+        trimmed = 0
+        while len(self.messages) > self.capacity:
+            self.keys.pop(0)
+            self.ids.discard(self.messages.pop(0).id)
+            self.complete = False
+            trimmed += 1
+        return trimmed
+
+    def tail(self, limit: int) -> Optional[List[MessageResponse]]:
+        if limit > len(self.messages) and not self.complete:
+            return None
+        return self.messages[-limit:]
+
+class RecentMessageCache:
+    """Per-room ring cache of the newest messages, with LRU eviction of cold rooms.
+
+    A room is seeded from the database on its first history read and then
+    kept current from the broadcast stream, which every worker receives,
+    so a cached tail never misses messages posted through another worker.
+    """
+
+    def __init__(self, room_size: int = None, max_total: int = None):
+        self.room_size = room_size or settings.message_cache_room_size
+        self.max_total = max_total or settings.message_cache_max_total
+        self.rooms: "OrderedDict[int, RoomTail]" = OrderedDict()
+        self.total = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, room_id: int, limit: int) -> Optional[List[MessageResponse]]:
+        room = self.rooms.get(room_id)
+        messages = room.tail(limit) if room is not None else None
+        if messages is None:
+            self.stats["misses"] += 1
+            return None
+        self.rooms.move_to_end(room_id)
+        self.stats["hits"] += 1
+        return messages
+
+    def seed(self, room_id: int, messages: List[MessageResponse], complete: bool):
+        """Install the newest `room_size` messages of a room, oldest first."""
+        self.evict_room(room_id)
+        room = RoomTail(messages, self.room_size, complete)
+        self.rooms[room_id] = room
+        self.total += len(room.messages)
+        self._enforce_cap()
+
+    def append(self, room_id: int, message: MessageResponse):
+        room = self.rooms.get(room_id)
+        if room is None:
+            # Only warm rooms are kept current; a cold room is seeded on its next read
+            return
+        before = len(room.messages)
+        if room.append(message) is None:
+            logger.warning(f"Message cache for room {room_id} missed an event before seq {message.seq}, evicting")
+            self.evict_room(room_id)
+            self.stats["invalidations"] += 1
+            return
+        self.total += len(room.messages) - before
+        self._enforce_cap()
+
+    def evict_room(self, room_id: int):
+        room = self.rooms.pop(room_id, None)
+        if room is not None:
+            self.total -= len(room.messages)
+
+    def clear(self):
+        """Drop every room, e.g. after the broadcast stream may have lost events."""
+        self.stats["invalidations"] += len(self.rooms)
+        self.rooms.clear()
+        self.total = 0
+
+    def _enforce_cap(self):
+        while self.total > self.max_total and self.rooms:
+            _, room = self.rooms.popitem(last=False)
+            self.total -= len(room.messages)
+            self.stats["evictions"] += 1
+
+    def on_broadcast(self, room_id: int, payload: str):
+        event = json.loads(payload)
+        if event.get("event") == "new-message":
+            self.append(room_id, MessageResponse(**event["data"]))
+
+message_cache = RecentMessageCache()
+
+
+# Matches are delimited with private-use characters rather than markup, so
+# the content can be HTML-escaped before the markers become <mark> tags
+HIGHLIGHT_START = "\ue000"
+HIGHLIGHT_STOP = "\ue001"
+
+# Search results are keyset-paginated on (rank DESC, id DESC)
+PG_SEARCH_SQL = f"""
+    SELECT m.id, m.room_id, m.user_id, m.seq, m.content, m.created_at, u.username, ranked.rank,
+           ts_headline('{SEARCH_CONFIG}', m.content, ranked.query,
+                       'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2') AS highlight
+    FROM (
+        SELECT m.id, ts_rank_cd(m.search_vector, q.query) AS rank, q.query
+        FROM messages m, websearch_to_tsquery('{SEARCH_CONFIG}', :q) AS q(query)
+        WHERE m.room_id = :room_id
+          AND m.search_vector @@ q.query
+          AND (:cursor_id IS NULL OR (ts_rank_cd(m.search_vector, q.query), m.id) < (:cursor_rank, :cursor_id))
+        ORDER BY rank DESC, m.id DESC
+        LIMIT :limit
+    ) AS ranked
+    JOIN messages m ON m.id = ranked.id
+    LEFT JOIN users u ON u.id = m.user_id
+    ORDER BY ranked.rank DESC, m.id DESC
+"""
+
+# bm25() is lower-is-better, so it is negated to share the Postgres ordering
+SQLITE_SEARCH_SQL = f"""
+    SELECT m.id, m.room_id, m.user_id, m.seq, m.content, m.created_at, u.username, ranked.rank,
+           ranked.highlight
+    FROM (
+        SELECT rowid AS id, -bm25(messages_fts) AS rank,
+               highlight(messages_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}') AS highlight
+        FROM messages_fts
+        WHERE messages_fts MATCH :q
+    ) AS ranked
+    JOIN messages m ON m.id = ranked.id
+    LEFT JOIN users u ON u.id = m.user_id
+    WHERE m.room_id = :room_id
+      AND (:cursor_id IS NULL OR ranked.rank < :cursor_rank
+           OR (ranked.rank = :cursor_rank AND m.id < :cursor_id))
+    ORDER BY ranked.rank DESC, m.id DESC
+    LIMIT :limit
+"""
+
+def encode_search_cursor(rank: float, message_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{rank!r}:{message_id}".encode()).decode()
+
+def decode_search_cursor(cursor: str) -> Tuple[float, int]:
+    """Raises ValueError for a cursor this module did not produce."""
+    try:
+        rank, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":", 1)
+        return float(rank), int(message_id)
+    except Exception:
+        raise ValueError("Invalid search cursor")
+
+def render_highlight(highlighted: str) -> str:
+    """HTML-escape highlighted content, then wrap the matches in <mark> tags."""
+    return html.escape(highlighted).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+
+def _fts5_query(q: str) -> str:
+    # Quote every term so user input is never parsed as FTS5 query syntax
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
+def search_room_messages(db: Session, room_id: int, q: str, limit: int, cursor: Optional[str] = None) -> MessageSearchPage:
+    """Ranked full-text search within one room, `limit` results per page."""
+    cursor_rank, cursor_id = decode_search_cursor(cursor) if cursor else (None, None)
+    if db.bind.dialect.name == "sqlite":
+        sql, query = SQLITE_SEARCH_SQL, _fts5_query(q)
+    else:
+        sql, query = PG_SEARCH_SQL, q
+    rows = db.execute(text(sql), {
+        "q": query,
+        "room_id": room_id,
+        "cursor_rank": cursor_rank,
+        "cursor_id": cursor_id,
+        "limit": limit + 1
+    }).mappings().all()
+
+    results = [
+        MessageSearchResult(
+            id=row["id"],
+            room_id=row["room_id"],
+            user_id=row["user_id"],
+            seq=row["seq"],
+            content=row["content"],
+            created_at=row["created_at"],
+            username="SodaBot" if row["user_id"] is None else (row["username"] or "Unknown"),
+            rank=row["rank"],
+            highlight=render_highlight(row["highlight"])
+        )
+        for row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = results[-1]
+        next_cursor = encode_search_cursor(last.rank, last.id)
+    return MessageSearchPage(results=results, next_cursor=next_cursor)
+
+
+# Rows fetched per round-trip from the server-side cursor during export
+EXPORT_BATCH_SIZE = 1000
+
+# Compressed exports are sync-flushed after the first batch and then every
+# this many rows, so the client sees bytes before the deflate window fills
+EXPORT_SYNC_FLUSH_ROWS = 10000
+
+def export_room_messages(room_id: int, compress: bool = False) -> Iterator[bytes]:
+    """Stream a room's full history as newline-delimited JSON, in seq order.
+
+    Runs on its own session with a server-side cursor so memory stays flat
+    regardless of room size; the request session may already be closed
+    while the response is streaming.
+    """
+    from app.models.user import User
+    gzip = zlib.compressobj(wbits=31) if compress else None  # wbits=31 selects the gzip container
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            Message.id, Message.room_id, Message.user_id, Message.seq,
+            Message.content, Message.created_at, User.username
+        ).outerjoin(
+            User, User.id == Message.user_id
+        ).filter(
+            Message.room_id == room_id
+        ).order_by(Message.seq.asc()).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+        buffer = []
+        unflushed = None  # Rows compressed since the last sync flush; None before the first
+        for row in rows:
+            buffer.append(json.dumps(message_event(
+                row, "SodaBot" if row.user_id is None else (row.username or "Unknown")
+            )))
+            if len(buffer) >= EXPORT_BATCH_SIZE:
+                chunk = ("\n".join(buffer) + "\n").encode("utf-8")
+                if gzip is None:
+                    yield chunk
+                else:
+                    compressed = gzip.compress(chunk)
+                    if unflushed is None or unflushed + len(buffer) >= EXPORT_SYNC_FLUSH_ROWS:
+                        compressed += gzip.flush(zlib.Z_SYNC_FLUSH)
+                        unflushed = 0
+                    else:
+                        unflushed += len(buffer)
+                    if compressed:
+                        yield compressed
+                buffer = []
+        tail = ("\n".join(buffer) + "\n").encode("utf-8") if buffer else b""
+        if gzip is None:
+            if tail:
+                yield tail
+        else:
+            yield gzip.compress(tail) + gzip.flush()
+    finally:
+        db.close()
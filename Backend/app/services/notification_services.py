@@ -0,0 +1,229 @@
+from sqlalchemy import Integer, cast, false, func, insert, literal, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.core.broadcast import USER_SCOPE, broadcast
+from app.models.notification import Notification
+from app.models.notification_counter import NotificationCounter
+from app.models.bet import Bet
+from app.models.room_member import RoomMember
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+def bet_result_notification_values(bet_id: int, mediator_id: int, description: str, created_at: datetime) -> dict:
+    """Column values for the notification asking a mediator to pick a bet's winner."""
+    return {
+        "user_id": mediator_id,
+        "bet_id": bet_id,
+        "type": "bet_result",
+        "message": f"Bet '{description}' has ended. Please select the winner.",
+        "created_at": created_at,
+        "resolved": False
+    }
+
+def bump_unread_counts(db: Session, deltas: Dict[int, int]) -> Dict[int, int]:
+    """Add `deltas` to users' unread counters in one upsert; returns the new counts.
+
+    Rows are written in user_id order so concurrent bumps cannot deadlock.
+    The caller commits together with the notification change it counts.
+    """
+    rows = [{"user_id": user_id, "unread": delta} for user_id, delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return {}
+    table = NotificationCounter.__table__
+    dialect_insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    stmt = dialect_insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={"unread": table.c.unread + stmt.excluded.unread}
+    ).returning(table.c.user_id, table.c.unread)
+    return {row.user_id: row.unread for row in db.execute(stmt)}
+
+def notification_event(values: dict) -> dict:
+    """The "notification" event pushed to a user's channel for one stored row."""
+    return {
+        "event": "notification",
+        "data": {
+            "id": values["id"],
+            "user_id": values["user_id"],
+            "bet_id": values.get("bet_id"),
+            "type": values["type"],
+            "message": values["message"],
+            "created_at": values["created_at"].isoformat(),
+            "resolved": bool(values.get("resolved"))
+        }
+    }
+
+def publish_notifications(rows: Iterable[dict]):
+    """Push committed notification rows to their users' channels.
+
+    Safe to call from request handlers and from worker threads alike; only
+    call it after the rows are committed, so a client never sees a
+    notification it cannot then fetch. This worker's unread cache is
+    invalidated right away; other workers drop theirs on the event.
+    """
+    for values in rows:
+        unread_cache.invalidate(values["user_id"])
+        broadcast.publish_nowait(values["user_id"], json.dumps(notification_event(values)), scope=USER_SCOPE)
+
+def create_bet_result_notification(bet: Bet, db: Session):
+    """Create a notification for the moderator when a bet timer expires."""
+    try:
+        notification = Notification(**bet_result_notification_values(
+            bet.id, bet.mediator_id, bet.description, datetime.now(timezone.utc)
+        ))
+        db.add(notification)
+        bump_unread_counts(db, {bet.mediator_id: 1})
+        db.commit()
+        publish_notifications([{column.name: getattr(notification, column.name) for column in Notification.__table__.columns}])
+        logger.info(f"Notification created for bet {bet.id} for mediator {bet.mediator_id}")
+    except Exception as e:
+        logger.error(f"Error creating notification for bet {bet.id}: {str(e)}")
+        db.rollback()
+
+
+def fan_out_room_notification(
+    db: Session,
+    room_id: int,
+    notification_type: str,
+    message: str,
+    bet_id: Optional[int] = None,
+    exclude_user_id: Optional[int] = None,
+    chunk_size: int = None
+) -> List[dict]:
+    """Give every member of a room the same notification without loading them.
+
+    Recipients are read from room_members inside the database: each chunk
+    is one INSERT ... SELECT over the next `chunk_size` members in user_id
+    order. Returns the created rows for `publish_notifications`. The caller
+    commits.
+    """
+    chunk_size = chunk_size or settings.notification_fanout_chunk_size
+    now = datetime.now(timezone.utc)
+    columns = [
+        Notification.user_id, Notification.bet_id, Notification.type,
+        Notification.message, Notification.created_at, Notification.resolved
+    ]
+    created = []
+    after = None
+    while True:
+        conditions = [RoomMember.room_id == room_id]
+        if after is not None:
+            conditions.append(RoomMember.user_id > after)
+        if exclude_user_id is not None:
+            conditions.append(RoomMember.user_id != exclude_user_id)
+        recipients = select(
+            RoomMember.user_id,
+            # Typed, so Postgres does not read a NULL bet_id as text
+            cast(literal(bet_id), Integer),
+            literal(notification_type),
+            literal(message),
+            literal(now),
+            false()
+        ).where(*conditions).distinct().order_by(RoomMember.user_id).limit(chunk_size)
+        rows = db.execute(
+            insert(Notification)
+            .from_select(columns, recipients)
+            .returning(*Notification.__table__.columns)
+        ).mappings().all()
+        bump_unread_counts(db, {row["user_id"]: 1 for row in rows})
+        created.extend(rows)
+        if len(rows) < chunk_size:
+            break
+        after = max(row["user_id"] for row in rows)
+    logger.info(f"Fanned out {notification_type} notification to {len(created)} members of room {room_id}")
+    return created
+
+def resolve_notifications(db: Session, user_id: int, ids: Optional[List[int]] = None, before: Optional[Tuple[datetime, int]] = None) -> Tuple[int, int]:
+    """Mark a user's notifications resolved in one UPDATE; returns (changed, unread left).
+
+    Targets `ids`, or everything keyed below the `before` (created_at, id)
+    anchor, or with neither every unresolved notification. Rows of other
+    users are never touched. The caller commits.
+    """
+    conditions = [Notification.user_id == user_id, Notification.resolved.isnot(True)]
+    if ids is not None:
+        conditions.append(Notification.id.in_(ids))
+    elif before is not None:
+        conditions.append(tuple_(Notification.created_at, Notification.id) < tuple_(*before))
+    resolved = db.execute(
+        update(Notification)
+        .where(*conditions)
+        .values(resolved=True)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if resolved:
+        return resolved, bump_unread_counts(db, {user_id: -resolved})[user_id]
+    return resolved, unread_count(db, user_id)
+
+def discount_room_bet_notifications(db: Session, room_id: int) -> Dict[int, int]:
+    """Take a room's unresolved bet notifications off their users' counters.
+
+    Call before deleting the room: its bets' notifications go with it via
+    cascade, which bypasses the counter bumps. Returns the new counts, to
+    pass to `publish_unread_counts` after commit. The caller commits.
+    """
+    removed = db.query(Notification.user_id, func.count(Notification.id)).join(
+        Bet, Bet.id == Notification.bet_id
+    ).filter(
+        Bet.room_id == room_id,
+        Notification.resolved.isnot(True)
+    ).group_by(Notification.user_id).all()
+    return bump_unread_counts(db, {user_id: -count for user_id, count in removed})
+
+def publish_unread_counts(counts: Dict[int, int]):
+    """Tell users (and every worker's unread cache) that notifications went away."""
+    for user_id, unread in counts.items():
+        unread_cache.invalidate(user_id)
+        broadcast.publish_nowait(user_id, json.dumps({
+            "event": "notifications-removed",
+            "data": {"unresolved": unread}
+        }), scope=USER_SCOPE)
+
+def unread_count(db: Session, user_id: int) -> int:
+    """The user's unresolved notification count; one primary-key lookup."""
+    counter = db.get(NotificationCounter, user_id)
+    return counter.unread if counter is not None else 0
+
+class UnreadCountCache:
+    """Read-through LRU of unread counters.
+
+    Every change to a user's notifications is followed by an event on that
+    user's broadcast channel, which each worker receives and uses to drop
+    its cached count; the TTL only backstops a missed event.
+    """
+
+    def __init__(self, max_users: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_users = settings.unread_cache_max_users if max_users is None else max_users
+        self.ttl = settings.unread_cache_ttl_seconds if ttl is None else ttl
+        self.users: "OrderedDict[int, Tuple[int, float]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, db: Session, user_id: int) -> int:
+        entry = self.users.get(user_id)
+        if entry is not None and entry[1] > time.monotonic():
+            self.users.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return entry[0]
+        self.stats["misses"] += 1
+        count = unread_count(db, user_id)
+        self.users[user_id] = (count, time.monotonic() + self.ttl)
+        self.users.move_to_end(user_id)
+        while len(self.users) > self.max_users:
+            self.users.popitem(last=False)
+        return count
+
+    def invalidate(self, user_id: int):
+        self.users.pop(user_id, None)
+
+    def on_broadcast(self, user_id: int, payload: str):
+        self.invalidate(user_id)
+
+unread_cache = UnreadCountCache()
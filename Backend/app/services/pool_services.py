@@ -0,0 +1,188 @@
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.bet import Bet, BetResult, BetStatus
+from app.models.bet_pool import BetPool
+from app.services.bet_services import settle_bets, utcnow
+
+try:
+    import numpy as np
+except ImportError:  # Pool math falls back to plain Python
+    np = None
+
+logger = logging.getLogger(__name__)
+
+class PoolBook:
+    """Every stake of one pool, held column-wise for vectorized repricing.
+
+    Per-outcome totals are kept incrementally, so odds are O(outcomes) per
+    stake. Projected payouts use the same rounding as settlement
+    (`compute_payouts` in parimutuel mode): a winning stake returns itself
+    plus its pro-rata share of the losing stakes, rounded down.
+    """
+
+    def __init__(self, pool_id: int, outcome_count: int, stakes: Iterable[Tuple[int, int, int, int]] = ()):
+        self.pool_id = pool_id
+        self.totals = [0] * outcome_count
+        self.ids = set()
+        self.size = 0
+        if np is not None:
+            self.columns = {name: np.zeros(64, dtype=np.int64) for name in ("bet_id", "user_id", "outcome", "amount")}
+        else:
+            self.columns = {name: [] for name in ("bet_id", "user_id", "outcome", "amount")}
+        for bet_id, user_id, outcome, amount in stakes:
+            self.add(bet_id, user_id, outcome, amount)
+
+    @property
+    def pot(self) -> int:
+        return sum(self.totals)
+
+    def add(self, bet_id: int, user_id: int, outcome: int, amount: int) -> bool:
+        """Record one stake; returns False if it was already counted."""
+        if bet_id in self.ids:
+            return False
+        if np is not None:
+            if self.size == len(self.columns["bet_id"]):
+                for name, column in self.columns.items():
+                    grown = np.zeros(len(column) * 2, dtype=np.int64)
+                    grown[:self.size] = column
+                    self.columns[name] = grown
+            for name, value in (("bet_id", bet_id), ("user_id", user_id), ("outcome", outcome), ("amount", amount)):
+                self.columns[name][self.size] = value
+        else:
+            for name, value in (("bet_id", bet_id), ("user_id", user_id), ("outcome", outcome), ("amount", amount)):
+                self.columns[name].append(value)
+        self.ids.add(bet_id)
+        self.totals[outcome] += amount
+        self.size += 1
+        return True
+
+    def odds(self) -> List[Optional[float]]:
+        """Decimal odds per outcome (pot / backing); None while nobody backs it."""
+        pot = self.pot
+        return [pot / total if total else None for total in self.totals]
+
+    def quote(self, outcome: int, amount: int) -> int:
+        """Payout a new `amount` on `outcome` would receive if it won right now."""
+        backing = self.totals[outcome] + amount
+        return amount + (amount * (self.pot + amount - backing)) // backing
+
+    def projected_payouts(self):
+        """Payout of every stake if its own outcome wins, in insertion order."""
+        pot = self.pot
+        if np is not None:
+            amount = self.columns["amount"][:self.size]
+            backing = np.asarray(self.totals, dtype=np.int64)[self.columns["outcome"][:self.size]]
+            return amount + (amount * (pot - backing)) // backing
+        return [
+            amount + (amount * (pot - self.totals[outcome])) // self.totals[outcome]
+            for outcome, amount in zip(self.columns["outcome"], self.columns["amount"])
+        ]
+
+    def position(self, user_id: int) -> List[Tuple[int, int]]:
+        """(staked, projected payout) per outcome for one user."""
+        staked = [0] * len(self.totals)
+        payout = [0] * len(self.totals)
+        if np is not None:
+            mask = self.columns["user_id"][:self.size] == user_id
+            if mask.any():
+                outcomes = self.columns["outcome"][:self.size][mask]
+                count = len(self.totals)
+                staked = np.bincount(outcomes, weights=self.columns["amount"][:self.size][mask], minlength=count).astype(np.int64).tolist()
+                payout = np.bincount(outcomes, weights=self.projected_payouts()[mask], minlength=count).astype(np.int64).tolist()
+            return list(zip(staked, payout))
+        for owner, outcome, amount, projected in zip(
+            self.columns["user_id"], self.columns["outcome"], self.columns["amount"], self.projected_payouts()
+        ):
+            if owner == user_id:
+                staked[outcome] += amount
+                payout[outcome] += projected
+        return list(zip(staked, payout))
+
+class PoolOddsCache:
+    """LRU of PoolBooks, seeded from the pool's stakes on first read.
+
+    Like the message cache, warm books are kept current from the broadcast
+    stream, so stakes placed through another worker are counted too;
+    duplicates are ignored by bet id.
+    """
+
+    def __init__(self, max_pools: int = None):
+        self.max_pools = max_pools or settings.pool_cache_max_pools
+        self.pools: "OrderedDict[int, PoolBook]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, db: Session, pool: BetPool) -> PoolBook:
+        book = self.pools.get(pool.id)
+        if book is not None:
+            self.pools.move_to_end(pool.id)
+            self.stats["hits"] += 1
+            return book
+        self.stats["misses"] += 1
+        stakes = db.query(Bet.id, Bet.user_id, Bet.outcome, Bet.amount).filter(
+            Bet.pool_id == pool.id,
+            Bet.status != BetStatus.REJECTED
+        ).order_by(Bet.id).all()
+        book = PoolBook(pool.id, len(pool.outcomes), stakes)
+        self.pools[pool.id] = book
+        while len(self.pools) > self.max_pools:
+            self.pools.popitem(last=False)
+            self.stats["evictions"] += 1
+        return book
+
+    def add_stake(self, pool_id: int, bet_id: int, user_id: int, outcome: int, amount: int):
+        book = self.pools.get(pool_id)
+        if book is not None:
+            book.add(bet_id, user_id, outcome, amount)
+
+    def evict_pool(self, pool_id: int):
+        self.pools.pop(pool_id, None)
+
+    def on_broadcast(self, room_id: int, payload: str):
+        event = json.loads(payload)
+        if event.get("event") == "pool-stake":
+            data = event["data"]
+            self.add_stake(data["pool_id"], data["bet_id"], data["user_id"], data["outcome"], data["amount"])
+        elif event.get("event") == "pool-settled":
+            self.evict_pool(event["data"]["pool_id"])
+
+pool_cache = PoolOddsCache()
+
+
+def settle_pool(db: Session, pool: BetPool, winning_outcome: int, mediator_id: int) -> Optional[dict]:
+    """Close a pool on `winning_outcome` and pay its stakes out parimutuel-style.
+
+    The pool row is claimed with a conditional UPDATE, which waits for any
+    stake still holding its share lock, so no stake can slip in after the
+    settlement has read the book. Returns None if the pool was already
+    settled or has not reached its end_time yet. The caller commits.
+    """
+    claimed = db.execute(
+        update(BetPool)
+        .where(
+            BetPool.id == pool.id,
+            BetPool.mediator_id == mediator_id,
+            BetPool.winning_outcome.is_(None),
+            BetPool.end_time <= utcnow()
+        )
+        .values(winning_outcome=winning_outcome, settled_at=datetime.now(timezone.utc))
+        .returning(BetPool.id)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if claimed is None:
+        return None
+    stakes = db.query(Bet.id, Bet.outcome).filter(
+        Bet.pool_id == pool.id,
+        Bet.result == BetResult.UNKNOWN,
+        Bet.status != BetStatus.REJECTED
+    ).all()
+    results = {
+        stake.id: BetResult.WON if stake.outcome == winning_outcome else BetResult.LOST
+        for stake in stakes
+    }
+    return settle_bets(db, pool.room_id, results, mediator_id=mediator_id, mode="parimutuel", pool_id=pool.id)
@@ -0,0 +1,24 @@
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.models as models
+from app.models.base import Base
+
+@pytest.fixture
+def db(tmp_path):
+    """A session on a fresh SQLite database with every table created."""
+    # Every model is loaded so the relationship mappers can be configured
+    for name in models.__all__:
+        getattr(models, name)
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine)
+    engine.dispose()
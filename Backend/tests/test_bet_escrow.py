@@ -0,0 +1,140 @@
+"""Bet coin escrow, including a concurrency stress test.
+
+The stress test needs real row-level locking, so it only runs when
+TEST_DATABASE_URL points at a disposable Postgres database (its tables are
+dropped afterwards) and is skipped otherwise. The other tests run against
+that database too, or a temporary SQLite file when it is unset.
+"""
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from app.models.base import Base
+# Every model is imported so the relationship mappers can be configured
+from app.models.bet import Bet, BetStatus, BetResult
+from app.models.bet_pool import BetPool
+from app.models.coin_ledger import CoinLedgerEntry
+from app.models.message import Message
+from app.models.notification import Notification
+from app.models.refresh_token import RefreshToken
+from app.models.room import Room
+from app.models.room_member import RoomMember
+from app.models.user import User
+from app.services.bet_services import escrow_coins
+from app.services.ledger_services import current_balance, snapshot_balances
+
+STARTING_COINS = 1000
+PLACEMENTS = 300
+
+@pytest.fixture
+def session_factory(tmp_path):
+    url = os.getenv("TEST_DATABASE_URL") or f"sqlite:///{tmp_path / 'escrow.db'}"
+    connect_args = {"timeout": 30, "check_same_thread": False} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args, pool_size=20, max_overflow=20)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+@pytest.fixture
+def postgres_session_factory():
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url or not url.startswith("postgresql"):
+        pytest.skip("set TEST_DATABASE_URL to a Postgres database to run the concurrency test")
+    engine = create_engine(url, pool_size=20, max_overflow=20)
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+def place_bet(session_factory, user_id: int, room_id: int, amount: int) -> bool:
+    db = session_factory()
+    try:
+        if escrow_coins(db, user_id, amount) is None:
+            db.rollback()
+            return False
+        db.add(Bet(
+            room_id=room_id,
+            user_id=user_id,
+            description="stress",
+            amount=amount,
+            status=BetStatus.PENDING,
+            result=BetResult.UNKNOWN,
+            mediator_id=user_id,
+            end_time=datetime.now(timezone.utc) + timedelta(hours=1)
+        ))
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+def test_parallel_placements_never_overdraw(postgres_session_factory):
+    db = postgres_session_factory()
+    user = User(email="stress@example.com", username="stress", password_hash="x", coins=STARTING_COINS)
+    db.add(user)
+    db.flush()
+    room = Room(creator_id=user.id, name="stress room")
+    db.add(room)
+    db.commit()
+    user_id, room_id = user.id, room.id
+    db.close()
+
+    amounts = [random.randint(1, 25) for _ in range(PLACEMENTS)]
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        placed = list(pool.map(lambda amount: place_bet(postgres_session_factory, user_id, room_id, amount), amounts))
+
+    db = postgres_session_factory()
+    try:
+        balance = current_balance(db, user_id)
+        bet_count, staked = db.query(func.count(Bet.id), func.coalesce(func.sum(Bet.amount), 0)).filter(
+            Bet.user_id == user_id
+        ).one()
+    finally:
+        db.close()
+
+    assert balance >= 0
+    assert bet_count == sum(placed)
+    assert staked == sum(amount for amount, ok in zip(amounts, placed) if ok)
+    assert balance + staked == STARTING_COINS
+    # 300 bets averaging 13 coins exceed the balance, so some must be refused
+    assert not all(placed)
+
+def test_insufficient_balance_is_refused(session_factory):
+    db = session_factory()
+    try:
+        user = User(email="poor@example.com", username="poor", password_hash="x", coins=5)
+        db.add(user)
+        db.commit()
+        assert escrow_coins(db, user.id, 6) is None
+        assert escrow_coins(db, user.id, 5) == 0
+        db.commit()
+        assert current_balance(db, user.id) == 0
+    finally:
+        db.close()
+
+def test_snapshot_preserves_balance(session_factory):
+    db = session_factory()
+    try:
+        user = User(email="snap@example.com", username="snap", password_hash="x", coins=100)
+        db.add(user)
+        db.commit()
+        for amount in (10, 20, 30):
+            assert escrow_coins(db, user.id, amount) is not None
+        db.commit()
+        assert db.query(User.coins).filter(User.id == user.id).scalar() == 100
+        assert current_balance(db, user.id) == 40
+
+        assert snapshot_balances(db, [user.id]) == 3
+        db.commit()
+        assert db.query(User.coins).filter(User.id == user.id).scalar() == 40
+        assert current_balance(db, user.id) == 40
+        assert db.query(CoinLedgerEntry).filter(CoinLedgerEntry.snapshotted.is_(False)).count() == 0
+    finally:
+        db.close()
@@ -0,0 +1,89 @@
+"""Payout arithmetic and batch settlement of bets."""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.bet import Bet, BetResult, BetStatus
+from app.models.room import Room
+from app.models.user import User
+from app.services import bet_services
+from app.services.bet_services import compute_payouts, escrow_coins, settle_bets
+from app.services.ledger_services import current_balance
+
+WON, LOST, DRAW = BetResult.WON, BetResult.LOST, BetResult.DRAW
+
+def both_branches(monkeypatch, amounts, results, mode):
+    """compute_payouts with numpy, then with the pure-Python fallback; asserts they agree."""
+    assert bet_services.np is not None, "numpy is needed to compare both branches"
+    vectorized = compute_payouts(amounts, results, mode)
+    with monkeypatch.context() as patch:
+        patch.setattr(bet_services, "np", None)
+        plain = compute_payouts(amounts, results, mode)
+    assert vectorized == plain
+    assert all(type(payout) is int for payout in vectorized)
+    return plain
+
+def test_fixed_payouts(monkeypatch):
+    assert both_branches(monkeypatch, [10, 20, 30], [WON, LOST, DRAW], "fixed") == [20, 0, 30]
+
+def test_parimutuel_splits_losing_stakes_in_proportion(monkeypatch):
+    # Winners split 60 losing coins 1:2, draws are refunded
+    payouts = both_branches(monkeypatch, [10, 20, 60, 5], [WON, WON, LOST, DRAW], "parimutuel")
+    assert payouts == [30, 60, 0, 5]
+
+def test_parimutuel_rounds_down(monkeypatch):
+    # 10 losing coins over stakes 1:1:1 is 3.33 each; the remainder is not paid out
+    payouts = both_branches(monkeypatch, [5, 5, 5, 10], [WON, WON, WON, LOST], "parimutuel")
+    assert payouts == [8, 8, 8, 0]
+    assert sum(payouts) < 25
+
+def test_parimutuel_without_winners_refunds_everyone(monkeypatch):
+    assert both_branches(monkeypatch, [10, 20, 30], [LOST, LOST, DRAW], "parimutuel") == [10, 20, 30]
+    assert both_branches(monkeypatch, [], [], "parimutuel") == []
+
+@pytest.mark.parametrize("mode", ["fixed", "parimutuel"])
+def test_branches_agree_on_random_books(monkeypatch, mode):
+    rng = random.Random(16)
+    for _ in range(200):
+        size = rng.randint(1, 40)
+        amounts = [rng.randint(1, 10 ** 6) for _ in range(size)]
+        results = [rng.choice((WON, LOST, DRAW)) for _ in range(size)]
+        payouts = both_branches(monkeypatch, amounts, results, mode)
+        if mode == "parimutuel":
+            assert sum(payouts) <= sum(amounts)
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        compute_payouts([1], [WON], "odds")
+
+def test_settle_pays_only_approved_unsettled_bets(db):
+    user = User(email="b@example.com", username="bettor", password_hash="x", coins=100)
+    db.add(user)
+    db.flush()
+    room = Room(creator_id=user.id, name="settle")
+    db.add(room)
+    db.flush()
+    bets = {}
+    for status in (BetStatus.APPROVED, BetStatus.PENDING, BetStatus.REJECTED):
+        bet = Bet(
+            room_id=room.id, user_id=user.id, mediator_id=user.id, description=f"{status.value} bet",
+            amount=10, status=status, end_time=datetime(2026, 1, 1) + timedelta(hours=1)
+        )
+        db.add(bet)
+        db.flush()
+        escrow_coins(db, user.id, bet.amount, bet.id)
+        bets[status] = bet.id
+    db.commit()
+
+    summary = settle_bets(db, room.id, {bet_id: WON for bet_id in bets.values()})
+    db.commit()
+    assert summary["settled"] == 1
+    assert summary["skipped"] == 2
+    assert summary["total_paid"] == 20
+    assert current_balance(db, user.id) == 90
+    results = dict(db.query(Bet.status, Bet.result).all())
+    assert results == {BetStatus.APPROVED: WON, BetStatus.PENDING: BetResult.UNKNOWN, BetStatus.REJECTED: BetResult.UNKNOWN}
+
+    # Settling again finds nothing left to pay
+    assert settle_bets(db, room.id, {bets[BetStatus.APPROVED]: LOST})["settled"] == 0
@@ -0,0 +1,53 @@
+"""RoomHub delivery of live frames after a resume replay."""
+import asyncio
+import json
+
+from app.core.hub import Frame, RoomHub
+
+class FakeWebSocket:
+    def __init__(self):
+        self.scope = {"subprotocols": []}
+        self.sent = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+def message(seq: int) -> str:
+    return json.dumps({"event": "new-message", "data": {"id": seq, "seq": seq}})
+
+def test_frames_already_sent_are_dropped_by_seq():
+    async def main():
+        hub = RoomHub(queue_size=20, send_timeout=1)
+        websocket = FakeWebSocket()
+        subscriber = await hub.connect(1, websocket, paused=True)
+        # Queued while the replay (through seq 3) was being read
+        for seq in (2, 3, 4):
+            hub.publish(1, message(seq))
+        subscriber.start(last_sent_seq=3)
+        for seq in (3, 6, 5, 7):
+            hub.publish(1, message(seq))
+        hub.publish(1, json.dumps({"event": "bet-created", "data": {"id": 9}}))
+        await asyncio.sleep(0.05)
+        hub.disconnect(subscriber)
+        return websocket.sent
+
+    sent = asyncio.run(main())
+    # Only frames covered by the replay are dropped; 5 arriving after 6 is still new
+    assert [frame["data"].get("seq") for frame in sent] == [4, 6, 5, 7, None]
+    assert sent[-1]["event"] == "bet-created"
+
+def test_fresh_subscriber_sends_out_of_order_messages():
+    async def main():
+        hub = RoomHub(queue_size=20, send_timeout=1)
+        websocket = FakeWebSocket()
+        subscriber = await hub.connect(1, websocket)
+        for seq in (1, 3, 2, 4):
+            hub.publish_frame(1, Frame(message(seq)))
+        await asyncio.sleep(0.05)
+        hub.disconnect(subscriber)
+        return websocket.sent
+
+    assert [frame["data"]["seq"] for frame in asyncio.run(main())] == [1, 3, 2, 4]
@@ -0,0 +1,49 @@
+"""The mediator queue merges pending and overdue bets in (end_time, id) order."""
+import asyncio
+from datetime import datetime, timedelta
+
+from app.api.bets import get_mediating_bets
+from app.models.bet import Bet, BetResult, BetStatus
+from app.models.room import Room
+from app.models.user import User
+
+def test_queue_merges_pending_and_overdue_bets(db):
+    mediator = User(email="m@example.com", username="mediator", password_hash="x")
+    bettor = User(email="b@example.com", username="bettor", password_hash="x")
+    db.add_all([mediator, bettor])
+    db.flush()
+    room = Room(creator_id=mediator.id, name="queue")
+    db.add(room)
+    db.flush()
+
+    now = datetime.utcnow()
+    expected = []
+    for hours, status, result, due in (
+        (-5, BetStatus.APPROVED, BetResult.UNKNOWN, True),
+        (-4, BetStatus.PENDING, BetResult.UNKNOWN, True),
+        (-3, BetStatus.APPROVED, BetResult.WON, False),  # Already settled
+        (-2, BetStatus.REJECTED, BetResult.UNKNOWN, False),
+        (-1, BetStatus.APPROVED, BetResult.UNKNOWN, True),
+        (1, BetStatus.APPROVED, BetResult.UNKNOWN, False),  # Not over yet
+        (2, BetStatus.PENDING, BetResult.UNKNOWN, True),
+        (2, BetStatus.PENDING, BetResult.UNKNOWN, True),
+        (3, BetStatus.PENDING, BetResult.UNKNOWN, True),
+    ):
+        bet = Bet(
+            room_id=room.id, user_id=bettor.id, mediator_id=mediator.id, description="queued bet",
+            amount=1, status=status, result=result, end_time=now + timedelta(hours=hours)
+        )
+        db.add(bet)
+        db.flush()
+        if due:
+            expected.append(bet.id)
+    db.commit()
+
+    def page(after=None, limit=100):
+        return [bet.id for bet in asyncio.run(get_mediating_bets(after=after, limit=limit, user=mediator, db=db))]
+
+    assert page() == expected
+    first = page(limit=3)
+    assert first == expected[:3]
+    assert page(after=first[-1], limit=3) == expected[3:6]
+    assert page(after=expected[-1]) == []
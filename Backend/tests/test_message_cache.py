@@ -0,0 +1,166 @@
+"""RoomTail / RecentMessageCache, and the history endpoint that reads through them."""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from app.api.messages import get_room_messages
+from app.core.broadcast import InMemoryBroadcast
+from app.models.message import Message
+from app.models.room import Room
+from app.models.room_member import RoomMember
+from app.models.user import User
+from app.schemas.message import MessageResponse
+from app.services.message_services import RecentMessageCache, RoomTail, message_cache
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+def make_message(message_id: int, room_id: int = 1, minutes: int = None) -> MessageResponse:
+    return MessageResponse(
+        id=message_id,
+        room_id=room_id,
+        user_id=1,
+        content=f"message {message_id}",
+        created_at=START + timedelta(minutes=message_id if minutes is None else minutes),
+        username="alice",
+        seq=message_id
+    )
+
+def ids(messages):
+    return [m.id for m in messages]
+
+def test_tail_is_bounded_to_capacity():
+    tail = RoomTail([make_message(i) for i in range(1, 8)], capacity=5, complete=True)
+    assert ids(tail.messages) == [3, 4, 5, 6, 7]
+    # Older messages were cut off, so the tail no longer holds the whole room
+    assert tail.complete is False
+
+    assert tail.append(make_message(8)) == 1
+    assert ids(tail.messages) == [4, 5, 6, 7, 8]
+    assert tail.ids == {4, 5, 6, 7, 8}
+
+def test_tail_keeps_key_order_and_ignores_duplicates():
+    tail = RoomTail([make_message(1), make_message(2)], capacity=5, complete=True)
+    tail.append(make_message(3))
+    assert tail.append(make_message(2)) == 0
+    # Next seq, but created at the same time as message 1: ordered after it by id
+    tail.append(make_message(4, minutes=1))
+    assert ids(tail.messages) == [1, 4, 2, 3]
+    assert tail.keys == sorted(tail.keys)
+
+def test_tail_refuses_a_seq_gap():
+    tail = RoomTail([make_message(1), make_message(2)], capacity=5, complete=True)
+    assert tail.append(make_message(4)) is None
+    assert ids(tail.messages) == [1, 2]
+    assert tail.append(make_message(3)) == 0
+    assert tail.last_seq == 3
+
+def test_tail_serves_only_pages_it_can_answer():
+    complete = RoomTail([make_message(i) for i in range(1, 4)], capacity=5, complete=True)
+    assert ids(complete.tail(2)) == [2, 3]
+    # The whole room is cached, so a larger page is still exact
+    assert ids(complete.tail(10)) == [1, 2, 3]
+
+    partial = RoomTail([make_message(i) for i in range(1, 4)], capacity=5, complete=False)
+    assert ids(partial.tail(3)) == [1, 2, 3]
+    assert partial.tail(4) is None
+
+def test_cache_miss_then_hit_after_seed():
+    cache = RecentMessageCache(room_size=5, max_total=100)
+    assert cache.get(1, 10) is None
+    cache.seed(1, [make_message(i) for i in range(1, 4)], complete=True)
+    assert ids(cache.get(1, 10)) == [1, 2, 3]
+    assert cache.stats["misses"] == 1
+    assert cache.stats["hits"] == 1
+
+def test_broadcast_feeds_warm_rooms_only():
+    cache = RecentMessageCache(room_size=3, max_total=100)
+    cache.seed(1, [make_message(1)], complete=True)
+    for message in (make_message(2), make_message(3), make_message(4), make_message(5, room_id=2)):
+        cache.on_broadcast(message.room_id, json.dumps({
+            "event": "new-message",
+            "data": json.loads(message.model_dump_json())
+        }))
+    cache.on_broadcast(1, json.dumps({"event": "message-deleted", "data": {"id": 4}}))
+
+    assert ids(cache.get(1, 3)) == [2, 3, 4]
+    assert cache.get(1, 4) is None
+    # Room 2 was never read, so it is seeded from the database instead
+    assert 2 not in cache.rooms
+    assert cache.total == 3
+
+def test_seq_gap_evicts_the_room():
+    cache = RecentMessageCache(room_size=5, max_total=100)
+    cache.seed(1, [make_message(1), make_message(2)], complete=True)
+    # Seq 3 was never seen, so the room is read from the database again
+    cache.append(1, make_message(4))
+    assert 1 not in cache.rooms
+    assert cache.total == 0
+    assert cache.stats["invalidations"] == 1
+    assert cache.get(1, 2) is None
+
+def test_broadcast_reconnect_clears_every_room():
+    cache = RecentMessageCache(room_size=5, max_total=100)
+    backend = InMemoryBroadcast()
+    backend.on_reconnect(cache.clear)
+    cache.seed(1, [make_message(1)], complete=True)
+    cache.seed(2, [make_message(1, room_id=2)], complete=True)
+    backend._reconnected()
+    assert cache.rooms == {}
+    assert cache.total == 0
+
+def test_evict_room_and_total_cap():
+    cache = RecentMessageCache(room_size=3, max_total=5)
+    cache.seed(1, [make_message(i) for i in range(1, 4)], complete=True)
+    cache.seed(2, [make_message(i, room_id=2) for i in range(1, 3)], complete=True)
+    assert cache.total == 5
+
+    cache.evict_room(2)
+    assert 2 not in cache.rooms
+    assert cache.total == 3
+
+    cache.seed(2, [make_message(i, room_id=2) for i in range(1, 3)], complete=True)
+    cache.get(1, 1)
+    # Room 2 is now the least recently used and is evicted to stay under the cap
+    cache.seed(3, [make_message(1, room_id=3)], complete=True)
+    assert list(cache.rooms) == [1, 3]
+    assert cache.total == 4
+    assert cache.stats["evictions"] == 1
+
+def fetch(db, user, room_id, before=None, after=None, limit=10):
+    return ids(asyncio.run(get_room_messages(room_id, before=before, after=after, limit=limit, user=user, db=db)))
+
+def test_history_pages_match_with_and_without_cache(db, monkeypatch):
+    monkeypatch.setattr(message_cache, "room_size", 15)
+    user = User(email="a@example.com", username="alice", password_hash="x")
+    db.add(user)
+    db.flush()
+    room = Room(creator_id=user.id, name="history", last_message_seq=30)
+    db.add(room)
+    db.flush()
+    db.add(RoomMember(room_id=room.id, user_id=user.id))
+    db.add_all(Message(
+        room_id=room.id, user_id=user.id, content=f"m{i}", seq=i,
+        created_at=START + timedelta(minutes=i)
+    ) for i in range(1, 31))
+    db.commit()
+    message_cache.evict_room(room.id)
+    try:
+        newest = fetch(db, user, room.id)
+        assert newest == list(range(21, 31))
+        assert room.id in message_cache.rooms
+        hits = message_cache.stats["hits"]
+        assert fetch(db, user, room.id) == newest
+        assert message_cache.stats["hits"] == hits + 1
+
+        # Cursor pages always come from the database and stitch onto the tail
+        older = fetch(db, user, room.id, before=newest[0])
+        assert older == list(range(11, 21))
+        assert fetch(db, user, room.id, before=older[0], limit=50) == list(range(1, 11))
+        assert fetch(db, user, room.id, after=older[-1], limit=5) == list(range(21, 26))
+        assert fetch(db, user, room.id, after=30) == []
+
+        # A message seen on the broadcast stream shows up without a reseed
+        message_cache.append(room.id, make_message(31, room_id=room.id, minutes=31))
+        assert fetch(db, user, room.id, limit=3) == [29, 30, 31]
+    finally:
+        message_cache.evict_room(room.id)
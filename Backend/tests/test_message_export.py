@@ -0,0 +1,46 @@
+"""Streaming NDJSON export of a room's history."""
+import gzip
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+from app.models.message import Message
+from app.models.room import Room
+from app.models.user import User
+from app.services import message_services
+from app.services.message_services import EXPORT_BATCH_SIZE, export_room_messages
+
+MESSAGES = EXPORT_BATCH_SIZE * 2 + 500
+
+def seed_room(db) -> int:
+    user = User(email="a@example.com", username="alice", password_hash="x")
+    db.add(user)
+    db.flush()
+    room = Room(creator_id=user.id, name="export", last_message_seq=MESSAGES)
+    db.add(room)
+    db.flush()
+    start = datetime(2026, 1, 1)
+    db.add_all(Message(
+        room_id=room.id, user_id=user.id, content=f"m{i}", seq=i,
+        created_at=start + timedelta(seconds=i)
+    ) for i in range(1, MESSAGES + 1))
+    db.commit()
+    return room.id
+
+def test_compressed_export_flushes_first_batch(db, monkeypatch):
+    room_id = seed_room(db)
+    monkeypatch.setattr(message_services, "SessionLocal", sessionmaker(bind=db.get_bind()))
+
+    plain = b"".join(export_room_messages(room_id))
+    chunks = list(export_room_messages(room_id, compress=True))
+
+    lines = plain.decode("utf-8").splitlines()
+    assert [json.loads(line)["seq"] for line in lines] == list(range(1, MESSAGES + 1))
+    assert gzip.decompress(b"".join(chunks)) == plain
+
+    # The first chunk is sync-flushed, so it decodes to whole rows on its own
+    first = zlib.decompressobj(wbits=31).decompress(chunks[0]).decode("utf-8")
+    assert first.endswith("\n")
+    assert len(first.splitlines()) == EXPORT_BATCH_SIZE
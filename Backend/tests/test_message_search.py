@@ -0,0 +1,47 @@
+"""Full-text search: escaped highlights and query validation."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.messages import search_messages
+from app.models.message import Message
+from app.models.room import Room
+from app.models.room_member import RoomMember
+from app.models.user import User
+from app.services.message_services import search_room_messages
+
+def seed_room(db, contents):
+    user = User(email="s@example.com", username="searcher", password_hash="x")
+    db.add(user)
+    db.flush()
+    room = Room(creator_id=user.id, name="search", last_message_seq=len(contents))
+    db.add(room)
+    db.flush()
+    db.add(RoomMember(room_id=room.id, user_id=user.id))
+    start = datetime(2026, 1, 1)
+    db.add_all(Message(
+        room_id=room.id, user_id=user.id, content=content, seq=i,
+        created_at=start + timedelta(minutes=i)
+    ) for i, content in enumerate(contents, start=1))
+    db.commit()
+    return room, user
+
+def test_highlight_escapes_message_content(db):
+    room, _ = seed_room(db, ['<img src=x onerror="alert(1)"> hello & welcome', "unrelated"])
+
+    page = search_room_messages(db, room.id, "hello", 10)
+    assert [result.seq for result in page.results] == [1]
+    highlight = page.results[0].highlight
+    assert highlight == '&lt;img src=x onerror=&quot;alert(1)&quot;&gt; <mark>hello</mark> &amp; welcome'
+    # The raw content is still returned as stored
+    assert page.results[0].content.startswith("<img")
+
+@pytest.mark.parametrize("q", [" ", "\t \n"])
+def test_blank_query_is_rejected(db, q):
+    room, user = seed_room(db, ["hello"])
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(search_messages(room.id, q=q, cursor=None, limit=20, user=user, db=db))
+    assert error.value.status_code == 422
@@ -0,0 +1,130 @@
+"""Pool odds and parimutuel settlement."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.api.bets import settle_room_bets
+from app.models.bet import Bet, BetResult, BetStatus
+from app.models.bet_pool import BetPool
+from app.models.room import Room
+from app.models.user import User
+from app.schemas.bet import BetSettlementRequest
+from app.services import pool_services
+from app.services.bet_services import compute_payouts, escrow_coins
+from app.services.ledger_services import current_balance
+from app.services.pool_services import PoolBook, settle_pool
+
+# (bet_id, user_id, outcome, amount)
+STAKES = [(1, 10, 0, 30), (2, 11, 1, 10), (3, 10, 0, 5), (4, 12, 1, 7)]
+
+@pytest.fixture(params=["numpy", "plain"])
+def book_mode(request, monkeypatch):
+    if request.param == "plain":
+        monkeypatch.setattr(pool_services, "np", None)
+    return request.param
+
+def test_odds_follow_stakes(book_mode):
+    book = PoolBook(1, 3)
+    assert book.odds() == [None, None, None]
+    for stake in STAKES:
+        assert book.add(*stake)
+    assert not book.add(*STAKES[0])
+
+    assert book.totals == [35, 17, 0]
+    assert book.pot == 52
+    assert book.odds() == [pytest.approx(52 / 35), pytest.approx(52 / 17), None]
+    # 10 more on outcome 1 would share 35 losing coins with the 17 already there
+    assert book.quote(1, 10) == 10 + (10 * 35) // 27
+
+def test_projections_match_settlement_rounding(book_mode):
+    book = PoolBook(1, 2, STAKES)
+    projected = [int(payout) for payout in book.projected_payouts()]
+    for outcome in (0, 1):
+        results = [BetResult.WON if o == outcome else BetResult.LOST for _, _, o, _ in STAKES]
+        payouts = compute_payouts([amount for *_, amount in STAKES], results, "parimutuel")
+        assert [p for p, (_, _, o, _) in zip(projected, STAKES) if o == outcome] == \
+            [p for p, (_, _, o, _) in zip(payouts, STAKES) if o == outcome]
+
+    # User 10 holds both outcome-0 stakes: 30 + 5 staked, 30+14 and 5+2 projected
+    assert book.position(10) == [(35, 51), (0, 0)]
+    assert book.position(99) == [(0, 0), (0, 0)]
+
+def make_pool(db, stakes, ends_in: timedelta):
+    """A pool with escrowed stakes of (username, outcome, amount); returns (pool, users by name)."""
+    users = {}
+    for name in {name for name, _, _ in stakes} | {"mediator"}:
+        users[name] = User(email=f"{name}@example.com", username=name, password_hash="x", coins=100)
+        db.add(users[name])
+    db.flush()
+    mediator = users["mediator"]
+    room = Room(creator_id=mediator.id, name="pools")
+    db.add(room)
+    db.flush()
+    end_time = datetime.utcnow() + ends_in
+    pool = BetPool(
+        room_id=room.id, created_by=mediator.id, mediator_id=mediator.id,
+        description="who wins", outcomes=["home", "away", "draw"], end_time=end_time
+    )
+    db.add(pool)
+    db.flush()
+    for name, outcome, amount in stakes:
+        bet = Bet(
+            room_id=room.id, user_id=users[name].id, mediator_id=mediator.id, description="pool stake",
+            amount=amount, status=BetStatus.APPROVED, end_time=end_time, pool_id=pool.id, outcome=outcome
+        )
+        db.add(bet)
+        db.flush()
+        escrow_coins(db, users[name].id, amount, bet.id)
+    db.commit()
+    return pool, users
+
+def test_settle_pays_winners_their_share(db):
+    pool, users = make_pool(db, [("ann", 0, 30), ("bob", 1, 20), ("cat", 0, 10), ("dan", 2, 5)], timedelta(hours=-1))
+
+    summary = settle_pool(db, pool, 0, users["mediator"].id)
+    db.commit()
+    assert summary["settled"] == 4
+    assert summary["total_staked"] == 65
+    # 25 losing coins split 3:1 and rounded down: 30+18 and 10+6
+    assert summary["total_paid"] == 64
+    balances = {name: current_balance(db, user.id) for name, user in users.items()}
+    assert balances == {"ann": 118, "bob": 80, "cat": 106, "dan": 95, "mediator": 100}
+    db.refresh(pool)
+    assert pool.winning_outcome == 0
+
+    # A second settlement claims nothing
+    assert settle_pool(db, pool, 1, users["mediator"].id) is None
+
+def test_settle_refunds_when_nobody_backed_the_winner(db):
+    pool, users = make_pool(db, [("ann", 0, 30), ("bob", 1, 20)], timedelta(hours=-1))
+
+    summary = settle_pool(db, pool, 2, users["mediator"].id)
+    db.commit()
+    assert summary["total_paid"] == 50
+    assert current_balance(db, users["ann"].id) == 100
+    assert current_balance(db, users["bob"].id) == 100
+    assert {result for result, in db.query(Bet.result)} == {BetResult.LOST}
+
+def test_settle_is_refused_before_end_time(db):
+    pool, users = make_pool(db, [("ann", 0, 30), ("bob", 1, 20)], timedelta(hours=1))
+
+    assert settle_pool(db, pool, 0, users["mediator"].id) is None
+    db.rollback()
+    db.refresh(pool)
+    assert pool.winning_outcome is None
+    assert db.query(Bet).filter(Bet.result != BetResult.UNKNOWN).count() == 0
+    assert current_balance(db, users["ann"].id) == 70
+
+def test_bet_settlement_endpoint_ignores_pool_stakes(db):
+    pool, users = make_pool(db, [("ann", 0, 30), ("bob", 1, 20)], timedelta(hours=1))
+    stake_ids = [bet_id for bet_id, in db.query(Bet.id).filter(Bet.pool_id == pool.id)]
+
+    summary = asyncio.run(settle_room_bets(
+        BetSettlementRequest(room_id=pool.room_id, results={bet_id: BetResult.WON for bet_id in stake_ids}),
+        user=users["mediator"], db=db
+    ))
+    assert summary["settled"] == 0
+    assert summary["skipped"] == 2
+    assert current_balance(db, users["ann"].id) == 70
+    assert db.query(Bet).filter(Bet.result != BetResult.UNKNOWN).count() == 0
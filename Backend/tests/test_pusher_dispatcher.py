@@ -0,0 +1,135 @@
+"""PusherDispatcher against a local fake Pusher HTTP server.
+
+The server records every request and answers with the queued status codes
+(200 once they run out), so batching, retries and the overflow policy are
+exercised through the real Pusher client and HTTP backend.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+
+from app.config import settings
+from app.core.pusher import PusherDispatcher, PusherService
+
+class FakePusherServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakePusherHandler)
+        self.requests = []
+        self.statuses = []
+        self.lock = threading.Lock()
+
+    def events(self):
+        """Every event name received, in request order."""
+        return [event["name"] for _, body in self.requests for event in body.get("batch", [body])]
+
+class FakePusherHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests.append((self.path.split("?")[0], body))
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+        payload = b"{}" if status == 200 else b"error"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def fake_pusher(monkeypatch):
+    server = FakePusherServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(settings, "pusher_app_id", "1")
+    monkeypatch.setattr(settings, "pusher_key", "key")
+    monkeypatch.setattr(settings, "pusher_secret", "secret")
+    monkeypatch.setattr(settings, "pusher_host", "127.0.0.1")
+    monkeypatch.setattr(settings, "pusher_port", server.server_address[1])
+    monkeypatch.setattr(settings, "pusher_ssl", False)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def run_dispatcher(dispatcher: PusherDispatcher, events):
+    """Queue `events` before any worker runs, then flush them; returns enqueue results."""
+    async def main():
+        service = PusherService()
+        await dispatcher.start(service)
+        accepted = [dispatcher.enqueue("room-1", name, {"n": name}) for name in events]
+        await dispatcher.stop(timeout=10)
+        service.close()
+        return accepted
+    return asyncio.run(main())
+
+def test_events_are_coalesced_into_batches(fake_pusher):
+    dispatcher = PusherDispatcher(workers=1, batch_size=10, max_retries=0)
+    names = [f"e{i}" for i in range(25)]
+    assert all(run_dispatcher(dispatcher, names))
+
+    assert [path for path, _ in fake_pusher.requests] == ["/apps/1/batch_events"] * 3
+    assert [len(body["batch"]) for _, body in fake_pusher.requests] == [10, 10, 5]
+    assert fake_pusher.events() == names
+    assert dispatcher.stats["sent"] == 25
+    assert dispatcher.stats["batches"] == 3
+
+def test_single_event_uses_trigger(fake_pusher):
+    dispatcher = PusherDispatcher(workers=1, max_retries=0)
+    run_dispatcher(dispatcher, ["only"])
+
+    assert [path for path, _ in fake_pusher.requests] == ["/apps/1/events"]
+    assert fake_pusher.events() == ["only"]
+
+def test_server_errors_are_retried_with_backoff(fake_pusher):
+    fake_pusher.statuses = [500, 503]
+    dispatcher = PusherDispatcher(workers=1, max_retries=3, retry_backoff=0.05)
+    started = time.monotonic()
+    run_dispatcher(dispatcher, ["flaky"])
+
+    # Two failures wait 0.05s and then 0.1s before the third attempt succeeds
+    assert time.monotonic() - started >= 0.15
+    assert fake_pusher.events() == ["flaky"] * 3
+    assert dispatcher.stats["sent"] == 1
+    assert dispatcher.stats["failed"] == 0
+
+def test_retries_give_up_after_max_retries(fake_pusher):
+    fake_pusher.statuses = [500] * 10
+    dispatcher = PusherDispatcher(workers=1, max_retries=2, retry_backoff=0.01)
+    run_dispatcher(dispatcher, ["down"])
+
+    assert len(fake_pusher.requests) == 3
+    assert dispatcher.stats["sent"] == 0
+    assert dispatcher.stats["failed"] == 1
+
+def test_rejected_batch_is_not_retried(fake_pusher):
+    fake_pusher.statuses = [400]
+    dispatcher = PusherDispatcher(workers=1, max_retries=3, retry_backoff=0.01)
+    run_dispatcher(dispatcher, ["bad"])
+
+    assert len(fake_pusher.requests) == 1
+    assert dispatcher.stats["failed"] == 1
+
+def test_drop_newest_refuses_events_when_full(fake_pusher):
+    dispatcher = PusherDispatcher(queue_size=2, workers=1, max_retries=0, overflow_policy="drop_newest")
+    accepted = run_dispatcher(dispatcher, ["a", "b", "c"])
+
+    assert accepted == [True, True, False]
+    assert fake_pusher.events() == ["a", "b"]
+    assert dispatcher.stats["dropped"] == 1
+
+def test_drop_oldest_evicts_queued_events_when_full(fake_pusher):
+    dispatcher = PusherDispatcher(queue_size=2, workers=1, max_retries=0, overflow_policy="drop_oldest")
+    accepted = run_dispatcher(dispatcher, ["a", "b", "c"])
+
+    assert accepted == [True, True, True]
+    assert fake_pusher.events() == ["b", "c"]
+    assert dispatcher.stats["dropped"] == 1
@@ -0,0 +1,68 @@
+"""Deleting a room refunds the stakes of its open bets."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.api.rooms import delete_private_room, delete_public_room
+from app.models.bet import Bet, BetResult, BetStatus
+from app.models.bet_pool import BetPool
+from app.models.coin_ledger import CoinLedgerEntry, LedgerReason
+from app.models.room import Room
+from app.models.user import User
+from app.services.bet_services import escrow_coins, review_bet, settle_bets
+from app.services.ledger_services import current_balance
+
+@pytest.mark.parametrize("is_public", [True, False])
+def test_deleting_a_room_refunds_open_stakes(db, is_public):
+    owner = User(email="o@example.com", username="owner", password_hash="x", coins=100)
+    bettor = User(email="b@example.com", username="bettor", password_hash="x", coins=100)
+    db.add_all([owner, bettor])
+    db.flush()
+    room = Room(creator_id=owner.id, name="doomed", is_public=is_public, token=None if is_public else "doomed-token")
+    db.add(room)
+    db.flush()
+    end_time = datetime.utcnow() + timedelta(hours=1)
+    pool = BetPool(
+        room_id=room.id, created_by=owner.id, mediator_id=owner.id,
+        description="pool", outcomes=["yes", "no"], end_time=end_time
+    )
+    db.add(pool)
+    db.flush()
+
+    def stake(amount, status=BetStatus.PENDING, **extra):
+        bet = Bet(
+            room_id=room.id, user_id=bettor.id, mediator_id=owner.id, description="stake",
+            amount=amount, status=status, end_time=end_time, **extra
+        )
+        db.add(bet)
+        db.flush()
+        assert escrow_coins(db, bettor.id, amount, bet.id) is not None
+        return bet
+
+    stake(40)
+    stake(10, status=BetStatus.APPROVED)
+    stake(5, status=BetStatus.APPROVED, pool_id=pool.id, outcome=0)
+    rejected = stake(7)
+    settled = stake(8, status=BetStatus.APPROVED)
+    db.commit()
+    review_bet(db, rejected.id, owner.id, approve=False)
+    settle_bets(db, room.id, {settled.id: BetResult.LOST})
+    db.commit()
+    assert current_balance(db, bettor.id) == 100 - 40 - 10 - 5 - 8
+
+    if is_public:
+        asyncio.run(delete_public_room(room.id, user=owner, db=db))
+    else:
+        asyncio.run(delete_private_room("doomed-token", user=owner, db=db))
+
+    db.expire_all()
+    assert db.get(Room, room.id) is None
+    assert db.query(Bet).count() == 0
+    # Open stakes come back; the lost bet stays lost and the rejected one was refunded already
+    assert current_balance(db, bettor.id) == 92
+    refunds = db.query(CoinLedgerEntry.amount).filter(
+        CoinLedgerEntry.user_id == bettor.id,
+        CoinLedgerEntry.reason == LedgerReason.BET_REFUND
+    ).all()
+    assert sorted(amount for amount, in refunds) == [5, 7, 10, 40]
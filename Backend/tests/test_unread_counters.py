@@ -0,0 +1,181 @@
+"""notification_counters must equal the unresolved rows in notifications after every write path."""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+
+from app.api.notifications import resolve
+from app.api.rooms import delete_public_room
+from app.config import settings
+from app.models.bet import Bet, BetResult, BetStatus
+from app.models.notification import Notification
+from app.models.notification_counter import NotificationCounter
+from app.models.room import Room
+from app.models.room_member import RoomMember
+from app.models.user import User
+from app.schemas.notification import NotificationResolveRequest
+from app.services import bet_services
+from app.services.bet_services import BetExpiryScheduler
+from app.services.notification_services import (
+    UnreadCountCache,
+    create_bet_result_notification,
+    fan_out_room_notification,
+    publish_notifications,
+    resolve_notifications,
+    unread_cache,
+    unread_count
+)
+
+def assert_counters_match(db) -> dict:
+    """Compare every user's counter with a COUNT over notifications; returns the counts."""
+    db.expire_all()
+    counted = dict(db.query(Notification.user_id, func.count(Notification.id)).filter(
+        Notification.resolved.isnot(True)
+    ).group_by(Notification.user_id).all())
+    counters = {user_id: unread for user_id, unread in db.query(NotificationCounter.user_id, NotificationCounter.unread) if unread}
+    assert counters == counted
+    return counted
+
+def make_room(db, members: int = 3, name: str = "counters"):
+    users = [User(email=f"{name}{i}@example.com", username=f"{name}{i}", password_hash="x") for i in range(members)]
+    db.add_all(users)
+    db.flush()
+    room = Room(creator_id=users[0].id, name=name)
+    db.add(room)
+    db.flush()
+    db.add_all(RoomMember(room_id=room.id, user_id=user.id) for user in users)
+    db.commit()
+    return room, users
+
+def make_bet(db, room, user, mediator, status=BetStatus.APPROVED, result=BetResult.UNKNOWN, hours=-1) -> Bet:
+    bet = Bet(
+        room_id=room.id, user_id=user.id, mediator_id=mediator.id, description="counted bet",
+        amount=1, status=status, result=result, end_time=datetime.utcnow() + timedelta(hours=hours)
+    )
+    db.add(bet)
+    db.commit()
+    return bet
+
+def test_bet_result_notification_bumps_counter(db):
+    room, (owner, mediator, _) = make_room(db)
+    for _ in range(2):
+        create_bet_result_notification(make_bet(db, room, owner, mediator), db)
+    assert assert_counters_match(db) == {mediator.id: 2}
+
+def test_expiry_batch_bumps_counters(db, monkeypatch):
+    monkeypatch.setattr(bet_services, "SessionLocal", sessionmaker(bind=db.get_bind()))
+    room, (owner, mediator, other) = make_room(db)
+    bets = [
+        make_bet(db, room, owner, mediator),
+        make_bet(db, room, owner, mediator, status=BetStatus.PENDING),
+        make_bet(db, room, owner, other),
+        make_bet(db, room, owner, other, status=BetStatus.REJECTED),
+        make_bet(db, room, owner, other, result=BetResult.WON),
+        make_bet(db, room, owner, other, hours=1)  # Not due yet
+    ]
+    scheduler = BetExpiryScheduler()
+    scheduler._fire([bet.id for bet in bets], bet_services.utcnow())
+    assert assert_counters_match(db) == {mediator.id: 2, other.id: 1}
+
+    # A second worker claiming the same bets adds nothing
+    scheduler._fire([bet.id for bet in bets], bet_services.utcnow())
+    assert assert_counters_match(db) == {mediator.id: 2, other.id: 1}
+
+def test_fan_out_bumps_every_chunk(db):
+    room, users = make_room(db, members=7)
+    created = fan_out_room_notification(db, room.id, "room_closed", "closed", exclude_user_id=users[0].id, chunk_size=3)
+    db.commit()
+    assert len(created) == 6
+    assert assert_counters_match(db) == {user.id: 1 for user in users[1:]}
+
+    fan_out_room_notification(db, room.id, "room_closed", "closed again", chunk_size=2)
+    db.commit()
+    counts = assert_counters_match(db)
+    assert counts[users[0].id] == 1
+    assert counts[users[1].id] == 2
+
+def test_resolve_paths_decrement_counter(db):
+    room, (user, _, other) = make_room(db)
+    for _ in range(6):
+        fan_out_room_notification(db, room.id, "ping", "ping")
+    db.commit()
+    ids = [row.id for row in db.query(Notification.id).filter(Notification.user_id == user.id).order_by(Notification.id)]
+    other_id = db.query(Notification.id).filter(Notification.user_id == other.id).first().id
+
+    # Another user's id is ignored, and already resolved ids are not counted twice
+    assert resolve_notifications(db, user.id, ids=ids[:2] + [other_id]) == (2, 4)
+    db.commit()
+    assert resolve_notifications(db, user.id, ids=ids[:3]) == (1, 3)
+    db.commit()
+    assert assert_counters_match(db)[user.id] == 3
+
+    anchor = db.get(Notification, ids[4])
+    assert resolve_notifications(db, user.id, before=(anchor.created_at, anchor.id)) == (1, 2)
+    db.commit()
+    assert assert_counters_match(db)[user.id] == 2
+
+    assert resolve_notifications(db, user.id) == (2, 0)
+    db.commit()
+    assert resolve_notifications(db, user.id) == (0, 0)
+    counts = assert_counters_match(db)
+    assert user.id not in counts
+    assert counts[other.id] == 6
+
+def test_room_deletion_discounts_bet_notifications(db):
+    room, (owner, mediator, member) = make_room(db)
+    other_room, _ = make_room(db, name="other")
+    create_bet_result_notification(make_bet(db, room, owner, mediator), db)
+    create_bet_result_notification(make_bet(db, room, owner, member), db)
+    resolved = make_bet(db, room, owner, member)
+    create_bet_result_notification(resolved, db)
+    resolved_id = db.query(Notification.id).filter(Notification.bet_id == resolved.id).scalar()
+    resolve_notifications(db, member.id, ids=[resolved_id])
+    db.commit()
+    create_bet_result_notification(make_bet(db, other_room, owner, mediator), db)
+    assert assert_counters_match(db) == {mediator.id: 2, member.id: 1}
+
+    asyncio.run(delete_public_room(room.id, user=owner, db=db))
+    # The bet notifications went with the room; the "room_closed" ones replaced them
+    counts = assert_counters_match(db)
+    assert counts == {mediator.id: 2, member.id: 1}
+    assert db.query(Notification).filter(Notification.type == "room_closed").count() == 2
+
+def test_cache_serves_until_broadcast_invalidates(db):
+    room, (user, _, _) = make_room(db)
+    cache = UnreadCountCache(max_users=2, ttl=60)
+    assert cache.get(db, user.id) == 0
+
+    fan_out_room_notification(db, room.id, "ping", "ping")
+    db.commit()
+    assert cache.get(db, user.id) == 0
+    assert cache.stats == {"hits": 1, "misses": 1}
+
+    cache.on_broadcast(user.id, json.dumps({"event": "notification", "data": {}}))
+    assert cache.get(db, user.id) == unread_count(db, user.id) == 1
+
+    resolve_notifications(db, user.id)
+    db.commit()
+    cache.on_broadcast(user.id, json.dumps({"event": "notifications-resolved", "data": {}}))
+    assert cache.get(db, user.id) == 0
+
+def test_cache_bounds():
+    assert UnreadCountCache().max_users == settings.unread_cache_max_users
+    assert UnreadCountCache(max_users=0).max_users == 0
+    assert UnreadCountCache(ttl=0).ttl == 0
+
+def test_writers_invalidate_this_workers_cache_without_the_broadcast(db):
+    # The broadcast backend is not started here, so no event ever comes back
+    room, (user, member, _) = make_room(db)
+    assert unread_cache.get(db, member.id) == 0
+    try:
+        created = fan_out_room_notification(db, room.id, "ping", "ping", exclude_user_id=user.id)
+        db.commit()
+        publish_notifications(created)
+        assert unread_cache.get(db, member.id) == 1
+
+        asyncio.run(resolve(NotificationResolveRequest(all=True), user=member, db=db))
+        assert unread_cache.get(db, member.id) == 0
+    finally:
+        unread_cache.invalidate(member.id)